@@ -9,22 +9,27 @@ A beautiful web interface for automatic photo organization using:
 
 import streamlit as st
 import os
+import hashlib
 import tempfile
 import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from PIL import Image
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+import piexif
 
 # Import our algorithms
 from src.database import Database
 from src.models import Image as ImageModel
 from src.clustering import process_and_save_clustering
 from src.duplicate_detection import process_blur_filtering
-from src.graph_duplicates import detect_graph_based_duplicates, calculate_perceptual_hash
-from src.image_processing import detect_blur
+from src.graph_duplicates import detect_graph_based_duplicates
+from src.image_processing import analyze_file, content_fingerprint, file_fingerprint
 import imagehash
 
 # Page configuration
@@ -50,91 +55,236 @@ if 'images' not in st.session_state:
 if 'stats' not in st.session_state:
     st.session_state.stats = {}
 
+# Content-addressed store for uploaded files, shared across sessions
+UPLOAD_DIR = Path(tempfile.gettempdir()) / "album_maker_uploads"
+
+# APP1 (EXIF) segments are capped at 64 KB and sit right after SOI/APP0
+EXIF_SCAN_BYTES = 65536
+
+def read_exif_segment(source):
+    """Return a JPEG's raw EXIF APP1 payload without decoding the image.
+
+    source is a path or a binary file object (e.g. an upload held in memory).
+    Returns b'' for a JPEG without EXIF, or None when the header can't be
+    scanned (not a JPEG, or the segment extends past the scan window).
+    """
+    if hasattr(source, 'read'):
+        source.seek(0)
+        head = source.read(EXIF_SCAN_BYTES)
+    else:
+        with open(source, 'rb') as f:
+            head = f.read(EXIF_SCAN_BYTES)
+    if head[:2] != b'\xff\xd8':
+        return None
+    
+    pos = 2
+    while pos + 4 <= len(head) and head[pos] == 0xFF:
+        marker = head[pos + 1]
+        if marker in (0xD9, 0xDA):  # end of image / start of scan
+            return b''
+        length = int.from_bytes(head[pos + 2:pos + 4], 'big')
+        if marker == 0xE1 and head[pos + 4:pos + 10] == b'Exif\x00\x00':
+            segment = head[pos + 4:pos + 2 + length]
+            return segment if len(segment) == length - 2 else None
+        pos += 2 + length
+    return None
+
+def dms_to_decimal(dms, refs):
+    """Convert a batch of (degrees, minutes, seconds) rationals to signed decimals.
+
+    Args:
+        dms: Sequence of ((num, den), (num, den), (num, den)) triples
+        refs: Matching hemisphere references ('N', 'S', 'E' or 'W')
+
+    Returns:
+        np.ndarray: float64 degrees, negative for 'S'/'W'; NaN where a
+        denominator is zero
+    """
+    rationals = np.asarray(dms, dtype=np.float64).reshape(-1, 3, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        parts = rationals[:, :, 0] / rationals[:, :, 1]
+    decimal = parts[:, 0] + parts[:, 1] / 60 + parts[:, 2] / 3600
+    decimal[~np.isfinite(decimal)] = np.nan
+    return np.where(np.isin(np.asarray(refs), ['S', 'W']), -decimal, decimal)
+
+def _is_dms(value):
+    return len(value) == 3 and all(len(part) == 2 for part in value)
+
+def _gps_ref(value, default):
+    if value is None:
+        return default
+    return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+def extract_exif_fields(source):
+    """Extract the raw timestamp and GPS fields from an image's EXIF data.
+
+    source is a path or a binary file object. JPEGs are parsed straight from the APP1 segment; anything else falls
+    back to Pillow. GPS is returned unconverted as (lat_dms, lat_ref,
+    lon_dms, lon_ref) so callers can convert many images at once with
+    dms_to_decimal(), or None when missing. Failing to open the file raises.
+    """
+    segment = read_exif_segment(source)
+    if segment == b'':
+        return None, None
+    if segment is not None:
+        try:
+            exif_dict = piexif.load(segment)
+            timestamp = gps_fields = None
+            
+            dt_value = exif_dict['Exif'].get(piexif.ExifIFD.DateTimeOriginal)
+            if dt_value:
+                try:
+                    timestamp = datetime.strptime(dt_value.decode('utf-8'), "%Y:%m:%d %H:%M:%S")
+                except ValueError:
+                    pass
+            
+            gps = exif_dict['GPS']
+            if piexif.GPSIFD.GPSLatitude in gps and piexif.GPSIFD.GPSLongitude in gps:
+                gps_fields = (
+                    gps[piexif.GPSIFD.GPSLatitude],
+                    _gps_ref(gps.get(piexif.GPSIFD.GPSLatitudeRef), 'N'),
+                    gps[piexif.GPSIFD.GPSLongitude],
+                    _gps_ref(gps.get(piexif.GPSIFD.GPSLongitudeRef), 'E'),
+                )
+                # Malformed rationals fall through to the Pillow path
+                if not (_is_dms(gps_fields[0]) and _is_dms(gps_fields[2])):
+                    raise ValueError("malformed GPS rationals")
+            return timestamp, gps_fields
+        except Exception:
+            pass
+    return extract_exif_fields_with_pil(source)
+
+def extract_exif_fields_with_pil(source):
+    """Extract raw EXIF fields by opening the image with Pillow (slow path)."""
+    from PIL.ExifTags import TAGS, GPSTAGS
+    timestamp = gps_fields = None
+
+    with Image.open(source) as pil_image:
+        exif = pil_image.getexif()
+    
+        if exif:
+            # Extract DateTime from Exif IFD (not main EXIF!)
+            try:
+                exif_ifd = exif.get_ifd(0x8769)  # Exif IFD tag
+                if exif_ifd:
+                    for tag_id, value in exif_ifd.items():
+                        tag = TAGS.get(tag_id, tag_id)
+                        if tag == "DateTimeOriginal" or tag == "DateTime":
+                            try:
+                                # Handle bytes or string
+                                dt_str = value.decode('utf-8') if isinstance(value, bytes) else str(value)
+                                timestamp = datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
+                                break
+                            except:
+                                pass
+            except:
+                pass
+        
+            # Extract GPS from GPS IFD
+            try:
+                gps_ifd = exif.get_ifd(0x8825)  # GPS IFD tag
+                if gps_ifd:
+                    gps_data = {}
+                    for gps_tag_id, value in gps_ifd.items():
+                        gps_tag = GPSTAGS.get(gps_tag_id, gps_tag_id)
+                        gps_data[gps_tag] = value
+                
+                    # Parse GPS coordinates
+                    if 'GPSLatitude' in gps_data and 'GPSLongitude' in gps_data:
+                        lat = gps_data['GPSLatitude']
+                        lon = gps_data['GPSLongitude']
+                        lat_ref = _gps_ref(gps_data.get('GPSLatitudeRef'), 'N')
+                        lon_ref = _gps_ref(gps_data.get('GPSLongitudeRef'), 'E')
+                    
+                        # IFDRational values keep their numerator/denominator
+                        gps_fields = (
+                            tuple((v.numerator, v.denominator) if hasattr(v, 'denominator') else (float(v), 1) for v in lat),
+                            lat_ref,
+                            tuple((v.numerator, v.denominator) if hasattr(v, 'denominator') else (float(v), 1) for v in lon),
+                            lon_ref,
+                        )
+                        if not (_is_dms(gps_fields[0]) and _is_dms(gps_fields[2])):
+                            gps_fields = None
+            except:
+                pass
+    
+    return timestamp, gps_fields
+
+@st.cache_data(max_entries=2000)
+def load_thumbnail(file_path, mtime, size=256):
+    """Decode a gallery thumbnail; mtime is part of the cache key so edited files refresh."""
+    with Image.open(file_path) as pil_image:
+        if pil_image.format == 'JPEG':
+            # Let libjpeg downscale while decoding instead of after
+            pil_image.draft('RGB', (size, size))
+        pil_image.thumbnail((size, size))
+        return pil_image.copy()
+
 def load_images_from_upload(uploaded_files):
     """Load uploaded images and extract metadata."""
-    images = []
-    temp_dir = Path(tempfile.mkdtemp())
+    # Uploads are stored content-addressed in a shared directory, so files
+    # that were uploaded before are reused instead of written again
+    temp_dir = UPLOAD_DIR
     exif_errors = 0
     
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    for idx, uploaded_file in enumerate(uploaded_files):
-        # Save uploaded file temporarily
-        file_path = temp_dir / uploaded_file.name
-        with open(file_path, 'wb') as f:
-            f.write(uploaded_file.getbuffer())
-        
-        # Create image model
-        img_model = ImageModel(filename=str(file_path))
-        
-        # Try to extract EXIF data
-        try:
-            from PIL.ExifTags import TAGS, GPSTAGS
-            pil_image = Image.open(file_path)
-            exif = pil_image.getexif()
-            
-            if exif:
-                # Extract DateTime from Exif IFD (not main EXIF!)
-                try:
-                    exif_ifd = exif.get_ifd(0x8769)  # Exif IFD tag
-                    if exif_ifd:
-                        for tag_id, value in exif_ifd.items():
-                            tag = TAGS.get(tag_id, tag_id)
-                            if tag == "DateTimeOriginal" or tag == "DateTime":
-                                try:
-                                    # Handle bytes or string
-                                    dt_str = value.decode('utf-8') if isinstance(value, bytes) else str(value)
-                                    img_model.timestamp = datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
-                                    break
-                                except:
-                                    pass
-                except:
-                    pass
-                
-                # Extract GPS from GPS IFD
+    # Save uploaded files temporarily; the files are for the analysis workers
+    # and the gallery, while EXIF is read from the uploads still in memory
+    images = []
+    for uploaded_file in uploaded_files:
+        with uploaded_file.getbuffer() as buffer:
+            content_dir = temp_dir / hashlib.blake2b(buffer, digest_size=16).hexdigest()
+            # Fingerprint from the in-memory upload so Step 1 never re-reads the file
+            content_hash = content_fingerprint(buffer, buffer.nbytes)
+        file_path = content_dir / uploaded_file.name
+        if not file_path.exists():
+            content_dir.mkdir(parents=True, exist_ok=True)
+            # Write to a uniquely named file first so concurrent sessions uploading
+            # the same content never share a partial file; the rename is atomic
+            uploaded_file.seek(0)
+            with tempfile.NamedTemporaryFile(dir=content_dir, suffix='.part', delete=False) as f:
                 try:
-                    gps_ifd = exif.get_ifd(0x8825)  # GPS IFD tag
-                    if gps_ifd:
-                        gps_data = {}
-                        for gps_tag_id, value in gps_ifd.items():
-                            gps_tag = GPSTAGS.get(gps_tag_id, gps_tag_id)
-                            gps_data[gps_tag] = value
-                        
-                        # Parse GPS coordinates
-                        if 'GPSLatitude' in gps_data and 'GPSLongitude' in gps_data:
-                            lat = gps_data['GPSLatitude']
-                            lon = gps_data['GPSLongitude']
-                            lat_ref = gps_data.get('GPSLatitudeRef', b'N')
-                            lon_ref = gps_data.get('GPSLongitudeRef', b'E')
-                            
-                            # Handle bytes
-                            if isinstance(lat_ref, bytes):
-                                lat_ref = lat_ref.decode('utf-8')
-                            if isinstance(lon_ref, bytes):
-                                lon_ref = lon_ref.decode('utf-8')
-                            
-                            # Convert rational tuples to decimal (ensure float conversion)
-                            lat_decimal = float(lat[0]) + float(lat[1])/60 + float(lat[2])/3600
-                            lon_decimal = float(lon[0]) + float(lon[1])/60 + float(lon[2])/3600
-                            
-                            img_model.latitude = float(lat_decimal * (-1 if lat_ref == 'S' else 1))
-                            img_model.longitude = float(lon_decimal * (-1 if lon_ref == 'W' else 1))
-                except:
-                    pass
-            
-            pil_image.close()
+                    shutil.copyfileobj(uploaded_file, f, length=1024 * 1024)
+                except BaseException:
+                    f.close()
+                    os.unlink(f.name)
+                    raise
+            os.replace(f.name, file_path)
+        images.append(ImageModel(filename=str(file_path), content_hash=content_hash))
+    
+    # Extract EXIF data concurrently; Pillow's parsing is I/O bound enough
+    # for threads to overlap well
+    gps_images, gps_dms, gps_refs = [], [], []
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = {
+            executor.submit(extract_exif_fields, uploaded_file): img
+            for uploaded_file, img in zip(uploaded_files, images)
+        }
+        for idx, future in enumerate(as_completed(futures)):
+            img_model = futures[future]
+            try:
+                img_model.timestamp, gps_fields = future.result()
+                if gps_fields is not None:
+                    lat_dms, lat_ref, lon_dms, lon_ref = gps_fields
+                    gps_images.append(img_model)
+                    gps_dms.extend((lat_dms, lon_dms))
+                    gps_refs.extend((lat_ref, lon_ref))
+            except Exception as e:
+                # Count EXIF errors silently instead of showing each warning
+                exif_errors += 1
             
-        except Exception as e:
-            # Count EXIF errors silently instead of showing each warning
-            exif_errors += 1
-        
-        images.append(img_model)
-        
-        # Update progress
-        progress = (idx + 1) / len(uploaded_files)
-        progress_bar.progress(progress)
-        status_text.text(f"Loading images... {idx + 1}/{len(uploaded_files)}")
+            # Update progress
+            progress = (idx + 1) / len(uploaded_files)
+            progress_bar.progress(progress)
+            status_text.text(f"Loading images... {idx + 1}/{len(uploaded_files)}")
+    
+    # Convert all GPS coordinates in one vectorized pass
+    if gps_images:
+        coords = dms_to_decimal(gps_dms, gps_refs).reshape(-1, 2).tolist()
+        for img_model, (latitude, longitude) in zip(gps_images, coords):
+            img_model.latitude, img_model.longitude = latitude, longitude
     
     progress_bar.empty()
     status_text.empty()
@@ -152,7 +302,10 @@ def process_images(images, db, config):
     # Step 1: Save images to database
     st.info("💾 Saving images to database...")
     for img in images:
-        img.id = db.add_image(img)
+        if not img.content_hash:
+            img.content_hash = file_fingerprint(img.filename)
+    for img, image_id in zip(images, db.add_images_bulk(images)):
+        img.id = image_id
     
     # Step 2: GPS/Time Clustering
     if config['enable_clustering']:
@@ -169,24 +322,36 @@ def process_images(images, db, config):
     # Step 3: Calculate blur scores and hashes
     st.info("🔍 Analyzing image quality and calculating hashes...")
     progress_bar = st.progress(0)
-    for idx, img in enumerate(images):
-        try:
-            pil_image = Image.open(img.filename)
-            
-            # Calculate blur score
-            img.blur_score = detect_blur(pil_image)
-            
-            # Calculate perceptual hash
-            hashes = calculate_perceptual_hash(img.filename)
-            img.hash = str(hashes['ahash'])
-            
-            # Update database
-            db.update_image_blur_score(img.id, img.blur_score)
-            
-            pil_image.close()
-            progress_bar.progress((idx + 1) / len(images))
-        except Exception as e:
-            st.warning(f"Error processing {img.filename}: {e}")
+    
+    # Reuse results for files analyzed in earlier runs (same content hash)
+    to_analyze = []
+    analysis_results = []
+    cached_analyses = db.find_cached_analyses([img.content_hash for img in images])
+    for img in images:
+        cached = cached_analyses.get(img.content_hash)
+        if cached:
+            img.blur_score, img.hash = cached
+            analysis_results.append((img.id, img.blur_score, img.hash))
+        else:
+            to_analyze.append(img)
+    done = len(images) - len(to_analyze)
+    progress_bar.progress(done / len(images))
+    
+    # Decode + blur + hash runs in worker processes; results are written
+    # from this thread in a single transaction once all workers finish.
+    with ProcessPoolExecutor() as executor:
+        futures = {executor.submit(analyze_file, img.filename): img for img in to_analyze}
+        for idx, future in enumerate(as_completed(futures), done + 1):
+            img = futures[future]
+            try:
+                _, img.blur_score, img.hash = future.result()
+                analysis_results.append((img.id, img.blur_score, img.hash))
+            except Exception as e:
+                st.warning(f"Error processing {img.filename}: {e}")
+            progress_bar.progress(idx / len(images))
+    
+    # Update database
+    db.update_image_analysis_bulk(analysis_results)
     
     progress_bar.empty()
     
@@ -370,20 +535,17 @@ def main():
                     clusters = db.get_all_clusters()
                     
                     if clusters:
-                        # Create cluster data
-                        cluster_data = []
-                        for cluster in clusters:
-                            cluster_data.append({
-                                'Cluster ID': cluster.id,
-                                'Name': cluster.name,
-                                'Images': cluster.image_count,
-                                'Start Time': cluster.start_time,
-                                'End Time': cluster.end_time,
-                                'Latitude': cluster.center_lat,
-                                'Longitude': cluster.center_lon,
-                            })
-                        
-                        df_clusters = pd.DataFrame(cluster_data)
+                        # Build the table column-wise; numeric columns get typed arrays
+                        # (missing coordinates become NaN)
+                        df_clusters = pd.DataFrame({
+                            'Cluster ID': [cluster.id for cluster in clusters],
+                            'Name': [cluster.name for cluster in clusters],
+                            'Images': np.fromiter((cluster.image_count for cluster in clusters), dtype=np.int32, count=len(clusters)),
+                            'Start Time': [cluster.start_time for cluster in clusters],
+                            'End Time': [cluster.end_time for cluster in clusters],
+                            'Latitude': np.array([cluster.center_lat for cluster in clusters], dtype=float),
+                            'Longitude': np.array([cluster.center_lon for cluster in clusters], dtype=float),
+                        })
                         st.dataframe(df_clusters, use_container_width=True)
                         
                         # Map visualization
@@ -443,12 +605,15 @@ def main():
             )
             
             if view_mode == "By Cluster":
-                # Get all cluster IDs that actually have images
-                cluster_ids_with_images = set([img.cluster_id for img in images if img.cluster_id is not None])
+                # Bucket images by cluster once; selecting a cluster is then a lookup
+                images_by_cluster = defaultdict(list)
+                for img in images:
+                    if img.cluster_id is not None:
+                        images_by_cluster[img.cluster_id].append(img)
                 
                 # Get clusters from database and filter to only those with images
                 all_clusters = db.get_all_clusters()
-                clusters = [c for c in all_clusters if c.id in cluster_ids_with_images]
+                clusters = [c for c in all_clusters if c.id in images_by_cluster]
                 
                 if clusters:
                     cluster_names = [f"{c.id}: {c.name}" for c in clusters]
@@ -456,7 +621,7 @@ def main():
                     cluster_id = int(selected_cluster.split(':')[0])
                     
                     # Get images in cluster
-                    display_images = [img for img in images if img.cluster_id == cluster_id]
+                    display_images = images_by_cluster[cluster_id]
                 else:
                     st.warning("No clusters with images found")
                     display_images = []
@@ -479,15 +644,13 @@ def main():
                             img_model = display_images[i + j]
                             with col:
                                 try:
-                                    pil_img = Image.open(img_model.filename)
-                                    st.image(pil_img, use_container_width=True)
+                                    thumb = load_thumbnail(img_model.filename, os.path.getmtime(img_model.filename))
+                                    st.image(thumb, use_container_width=True)
                                     
                                     # Image info
                                     status = "✅ Kept" if not img_model.is_duplicate else "❌ Duplicate"
                                     st.caption(f"{Path(img_model.filename).name}")
                                     st.caption(f"{status} | Blur: {img_model.blur_score:.2f}")
-                                    
-                                    pil_img.close()
                                 except Exception as e:
                                     st.error(f"Error loading image: {e}")
             else:
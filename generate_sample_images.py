@@ -14,9 +14,12 @@ Generates 500 sample images with metadata and augmentations.
 Uses Lorem Picsum API for free random images.
 """
 
+import io
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image, ImageFilter, ImageDraw
 import json
 from datetime import datetime, timedelta
@@ -26,6 +29,7 @@ import piexif
 NUM_IMAGES = 500
 OUTPUT_DIR = "Sample_Images"
 IMAGE_SIZE = (800, 600)  # width, height
+DOWNLOAD_WORKERS = 16
 
 # GPS clusters: define some locations
 GPS_CLUSTERS = [
@@ -36,13 +40,19 @@ GPS_CLUSTERS = [
     {"lat": 33.4484, "lon": -112.0740, "name": "Phoenix"},  # Phoenix
 ]
 
-def fetch_image(url):
+def create_session():
+    """Create an HTTP session that keeps connections to the image host alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_image(session, url):
     """Fetch image from URL."""
-    response = requests.get(url)
-    if response.status_code == 200:
-        return Image.open(requests.get(url, stream=True).raw)
-    else:
+    response = session.get(url, timeout=10)
+    if response.status_code != 200:
         raise Exception(f"Failed to fetch image: {response.status_code}")
+    return Image.open(io.BytesIO(response.content))
 
 def add_noise(image, noise_type="blur"):
     """Add noise to image."""
@@ -118,13 +128,20 @@ def main():
 
     base_date = datetime(2025, 10, 29, 12, 0, 0)  # Current date
 
-    for i in range(NUM_IMAGES):
+    # Downloads run concurrently; augmenting and saving stay on this thread
+    session = create_session()
+    executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    futures = [
+        executor.submit(fetch_image, session, f"https://picsum.photos/{IMAGE_SIZE[0]}/{IMAGE_SIZE[1]}?random={i}")
+        for i in range(NUM_IMAGES)
+    ]
+
+    for i, future in enumerate(futures):
         print(f"Generating image {i+1}/{NUM_IMAGES}")
 
         # Fetch random image
-        url = f"https://picsum.photos/{IMAGE_SIZE[0]}/{IMAGE_SIZE[1]}?random={i}"
         try:
-            img = fetch_image(url)
+            img = future.result()
         except Exception as e:
             print(f"Error fetching image {i}: {e}")
             continue
@@ -155,6 +172,8 @@ def main():
 
         img.save(filepath, "JPEG", exif=exif_bytes)
 
+    executor.shutdown()
+    session.close()
     print("Done!")
 
 if __name__ == "__main__":
@@ -12,6 +12,7 @@ from pathlib import Path
 from PIL import Image, ImageFilter
 import tempfile
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
@@ -24,8 +25,7 @@ from src.duplicate_detection import (
     filter_blurred_duplicates,
     process_blur_filtering
 )
-from src.image_processing import detect_blur
-import imagehash
+from src.image_processing import analyze_file
 
 def create_test_images_with_blur():
     """
@@ -58,28 +58,19 @@ def create_test_images_with_blur():
 
     test_images = []
 
-    # Save sharp version
-    sharp_path = test_dir / "image_sharp.jpg"
-    base_img.save(sharp_path, quality=95)
-    test_images.append((str(sharp_path), "Sharp (original)"))
-
-    # Save slightly blurred version
-    slightly_blurred = base_img.filter(ImageFilter.GaussianBlur(radius=1))
-    slight_blur_path = test_dir / "image_slight_blur.jpg"
-    slightly_blurred.save(slight_blur_path, quality=95)
-    test_images.append((str(slight_blur_path), "Slight blur (radius=1)"))
-
-    # Save moderately blurred version
-    medium_blurred = base_img.filter(ImageFilter.GaussianBlur(radius=3))
-    medium_blur_path = test_dir / "image_medium_blur.jpg"
-    medium_blurred.save(medium_blur_path, quality=95)
-    test_images.append((str(medium_blur_path), "Medium blur (radius=3)"))
-
-    # Save heavily blurred version
-    heavy_blurred = base_img.filter(ImageFilter.GaussianBlur(radius=8))
-    heavy_blur_path = test_dir / "image_heavy_blur.jpg"
-    heavy_blurred.save(heavy_blur_path, quality=95)
-    test_images.append((str(heavy_blur_path), "Heavy blur (radius=8)"))
+    # Save the sharp original and its blurred variants; every variant is
+    # filtered from the same in-memory base image
+    variants = [
+        ("image_sharp.jpg", "Sharp (original)", None),
+        ("image_slight_blur.jpg", "Slight blur (radius=1)", 1),
+        ("image_medium_blur.jpg", "Medium blur (radius=3)", 3),
+        ("image_heavy_blur.jpg", "Heavy blur (radius=8)", 8),
+    ]
+    for filename, description, radius in variants:
+        variant = base_img if radius is None else base_img.filter(ImageFilter.GaussianBlur(radius=radius))
+        variant_path = test_dir / filename
+        variant.save(variant_path, quality=95)
+        test_images.append((str(variant_path), description))
 
     # Create a second set of duplicates (different image content)
     base_img2 = Image.new('RGB', (400, 400), color='lightblue')
@@ -109,18 +100,10 @@ def create_test_images_with_blur():
     print(f"Created {len(test_images)} test images in {test_dir}/")
     return test_images, test_dir
 
-def calculate_image_hashes(image_paths):
-    """Calculate perceptual hashes for images."""
-    print("\nCalculating perceptual hashes...")
-    hashes = {}
-    for path, description in image_paths:
-        img = Image.open(path)
-        # Use average hash for duplicate detection
-        img_hash = str(imagehash.average_hash(img))
-        hashes[path] = img_hash
-        print(f"  {Path(path).name}: hash={img_hash}")
-        img.close()
-    return hashes
+def compute_features(path):
+    """Decode an image once and return its (blur_score, average hash)."""
+    _, blur_score, img_hash = analyze_file(path)
+    return blur_score, img_hash
 
 def test_blur_detection():
     """Test blur detection on images with varying blur levels."""
@@ -136,16 +119,21 @@ def test_blur_detection():
     print("BLUR SCORE CALCULATION")
     print("-"*60)
 
-    blur_scores = []
+    # File names for the reports, computed once per path
+    basenames = {img_path: os.path.basename(img_path) for img_path, *_ in test_images}
+
+    # Blur score and hash come from a single decode per image, spread over
+    # all cores
+    paths = [img_path for img_path, _ in test_images]
+    with ProcessPoolExecutor() as executor:
+        features = dict(zip(paths, executor.map(compute_features, paths)))
     for img_path, description in test_images:
-        img = Image.open(img_path)
-        blur_score = detect_blur(img)
-        blur_scores.append((img_path, description, blur_score))
-        print(f"{Path(img_path).name:25} | {description:30} | Blur Score: {blur_score:.4f}")
-        img.close()
+        blur_score = features[img_path][0]
+        print(f"{basenames[img_path]:25} | {description:30} | Blur Score: {blur_score:.4f}")
 
-    # Calculate hashes
-    hashes = calculate_image_hashes(test_images)
+    print("\nCalculating perceptual hashes...")
+    for img_path, _ in test_images:
+        print(f"  {basenames[img_path]}: hash={features[img_path][1]}")
 
     # Create ImageModel objects
     print("\n" + "-"*60)
@@ -161,19 +149,18 @@ def test_blur_detection():
 
         image_models = []
         for img_path, description in test_images:
-            img = Image.open(img_path)
-            blur_score = detect_blur(img)
-            img_hash = hashes[img_path]
-            img.close()
-
+            blur_score, img_hash = features[img_path]
             img_model = ImageModel(
                 filename=img_path,
                 blur_score=blur_score,
                 hash=img_hash
             )
-            img_model.id = db.add_image(img_model)
             image_models.append(img_model)
 
+        # Insert all rows in a single transaction
+        for img_model, image_id in zip(image_models, db.add_images_bulk(image_models)):
+            img_model.id = image_id
+
         print(f"Added {len(image_models)} images to database")
 
         # Test greedy selection
@@ -188,7 +175,7 @@ def test_blur_detection():
             print(f"\n  Group {group_id}: {len(group_images)} images")
             for idx, img in enumerate(group_images):
                 marker = "✓ BEST" if idx == 0 else "  duplicate"
-                print(f"    {marker} | {Path(img.filename).name:25} | Blur: {img.blur_score:.4f} | Hash: {img.hash[:8]}...")
+                print(f"    {marker} | {basenames[img.filename]:25} | Blur: {img.blur_score:.4f} | Hash: {img.hash[:8]}...")
 
         # Test blur filtering pipeline
         print("\n" + "-"*60)
@@ -214,7 +201,7 @@ def test_blur_detection():
         for group in all_groups:
             best_img = db.get_image(group.best_image_id)
             print(f"\n  Group {group.id}:")
-            print(f"    Best image: {Path(best_img.filename).name}")
+            print(f"    Best image: {basenames[best_img.filename]}")
             print(f"    Blur score: {best_img.blur_score:.4f}")
             print(f"    Hash: {best_img.hash}")
 
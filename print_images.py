@@ -10,30 +10,41 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 from src.database import db
 from src.models import Image
 
+# Number of image records written to stdout per write call
+WRITE_BATCH_SIZE = 1000
+
 def print_image_data():
     """Print all image data from the database."""
     print("=== Album Maker Database - Image Data ===\n")
 
-    images = db.get_all_images()
+    total = db.count_images()
 
-    if not images:
+    if not total:
         print("No images found in database.")
         return
 
-    print(f"Total images: {len(images)}\n")
-
-    for i, img in enumerate(images, 1):
-        print(f"Image {i}:")
-        print(f"  ID: {img.id}")
-        print(f"  Filename: {img.filename}")
-        print(f"  GPS: ({img.latitude}, {img.longitude})" if img.latitude and img.longitude else "  GPS: Not available")
-        print(f"  Timestamp: {img.timestamp}")
-        print(f"  Blur Score: {img.blur_score:.3f}")
-        print(f"  Hash: {img.hash[:16]}..." if img.hash else "  Hash: Not computed")
-        print(f"  Cluster ID: {img.cluster_id}")
-        print(f"  Is Duplicate: {img.is_duplicate}")
-        print(f"  Duplicate Group: {img.duplicate_group}")
-        print()
+    print(f"Total images: {total}\n")
+
+    # Stream rows instead of loading the whole table, and write each batch
+    # of records to stdout in one call
+    lines = []
+    for i, img in enumerate(db.iter_images(), 1):
+        lines.append(f"Image {i}:")
+        lines.append(f"  ID: {img.id}")
+        lines.append(f"  Filename: {img.filename}")
+        lines.append(f"  GPS: ({img.latitude}, {img.longitude})" if img.latitude and img.longitude else "  GPS: Not available")
+        lines.append(f"  Timestamp: {img.timestamp}")
+        lines.append(f"  Blur Score: {img.blur_score:.3f}")
+        lines.append(f"  Hash: {img.hash[:16]}..." if img.hash else "  Hash: Not computed")
+        lines.append(f"  Cluster ID: {img.cluster_id}")
+        lines.append(f"  Is Duplicate: {img.is_duplicate}")
+        lines.append(f"  Duplicate Group: {img.duplicate_group}")
+        lines.append("")
+        if i % WRITE_BATCH_SIZE == 0:
+            sys.stdout.write("\n".join(lines) + "\n")
+            lines.clear()
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     print_image_data()
\ No newline at end of file
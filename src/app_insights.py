@@ -4,13 +4,11 @@ Application Insights integration for monitoring and telemetry.
 import os
 import logging
 from typing import Optional
-from opencensus.ext.azure import metrics_exporter
-from opencensus.ext.azure.log_exporter import AzureLogHandler
-from opencensus.stats import aggregation as aggregation_module
-from opencensus.stats import measure as measure_module
-from opencensus.stats import stats as stats_module
-from opencensus.stats import view as view_module
-from opencensus.tags import tag_map as tag_map_module
+
+# The opencensus/Azure exporters are imported inside the setup methods: they
+# pull in a large dependency tree that is dead weight when telemetry is off.
+
+logger = logging.getLogger(__name__)
 
 
 class AppInsights:
@@ -25,17 +23,33 @@ class AppInsights:
             self._setup_logging()
             self._setup_metrics()
         else:
-            logging.info("Application Insights not configured (missing connection string)")
+            logger.info("Application Insights not configured (missing connection string)")
     
     def _setup_logging(self):
         """Configure Azure Log Handler."""
-        logger = logging.getLogger(__name__)
-        logger.addHandler(AzureLogHandler(connection_string=self.connection_string))
+        from opencensus.ext.azure.log_exporter import AzureLogHandler
+        
+        # The handler queues records and exports them in batches from a
+        # background worker; larger, more frequent batches keep the queue
+        # short without a request per record
+        self.log_handler = AzureLogHandler(
+            connection_string=self.connection_string,
+            max_batch_size=512,
+            export_interval=5.0,
+        )
+        logger.addHandler(self.log_handler)
         logger.setLevel(logging.INFO)
-        logging.info("Application Insights logging enabled")
+        logger.info("Application Insights logging enabled")
     
     def _setup_metrics(self):
         """Setup custom metrics."""
+        from opencensus.ext.azure import metrics_exporter
+        from opencensus.stats import aggregation as aggregation_module
+        from opencensus.stats import measure as measure_module
+        from opencensus.stats import stats as stats_module
+        from opencensus.stats import view as view_module
+        from opencensus.tags import tag_map as tag_map_module
+        
         self.stats = stats_module.stats
         self.view_manager = self.stats.view_manager
         
@@ -97,63 +111,70 @@ class AppInsights:
         )
         self.view_manager.register_exporter(exporter)
         
-        logging.info("Application Insights metrics enabled")
+        # No tags are attached to measurements, so one empty map is shared
+        self.tag_map = tag_map_module.TagMap()
+        
+        logger.info("Application Insights metrics enabled")
+    
+    def _record_int(self, measure, value: int):
+        """Record an integer measurement."""
+        mmap = self.stats.stats_recorder.new_measurement_map()
+        mmap.measure_int_put(measure, value)
+        mmap.record(self.tag_map)
+    
+    def _record_float(self, measure, value: float):
+        """Record a float measurement."""
+        mmap = self.stats.stats_recorder.new_measurement_map()
+        mmap.measure_float_put(measure, value)
+        mmap.record(self.tag_map)
     
     def track_images_processed(self, count: int):
         """Track number of images processed."""
         if self.enabled:
-            mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
-            mmap.measure_int_put(self.images_processed, count)
-            mmap.record(tmap)
-            logging.info(f"Tracked: {count} images processed")
+            self._record_int(self.images_processed, count)
+            logger.info("Tracked: %d images processed", count)
     
     def track_clusters_created(self, count: int):
         """Track number of clusters created."""
         if self.enabled:
-            mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
-            mmap.measure_int_put(self.clusters_created, count)
-            mmap.record(tmap)
-            logging.info(f"Tracked: {count} clusters created")
+            self._record_int(self.clusters_created, count)
+            logger.info("Tracked: %d clusters created", count)
     
     def track_blur_filtered(self, count: int):
         """Track number of blurry images filtered."""
         if self.enabled:
-            mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
-            mmap.measure_int_put(self.blur_images_filtered, count)
-            mmap.record(tmap)
-            logging.info(f"Tracked: {count} blurry images filtered")
+            self._record_int(self.blur_images_filtered, count)
+            logger.info("Tracked: %d blurry images filtered", count)
     
     def track_duplicates_found(self, count: int):
         """Track number of duplicates found."""
         if self.enabled:
-            mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
-            mmap.measure_int_put(self.duplicates_found, count)
-            mmap.record(tmap)
-            logging.info(f"Tracked: {count} duplicates found")
+            self._record_int(self.duplicates_found, count)
+            logger.info("Tracked: %d duplicates found", count)
     
     def track_processing_time(self, seconds: float):
         """Track processing time."""
         if self.enabled:
-            mmap = self.stats.stats_recorder.new_measurement_map()
-            tmap = tag_map_module.TagMap()
-            mmap.measure_float_put(self.processing_time, seconds)
-            mmap.record(tmap)
-            logging.info(f"Tracked: {seconds:.2f}s processing time")
+            self._record_float(self.processing_time, seconds)
+            logger.info("Tracked: %.2fs processing time", seconds)
     
     def track_event(self, event_name: str, properties: Optional[dict] = None):
         """Track custom event."""
         if self.enabled:
             props = properties or {}
-            logging.info(f"Event: {event_name}", extra=props)
+            logger.info("Event: %s", event_name, extra=props)
     
     def track_exception(self, exception: Exception):
         """Track exception."""
         if self.enabled:
-            logging.exception(f"Exception occurred: {str(exception)}")
+            logger.exception("Exception occurred: %s", exception)
+            # Don't leave the exception queued if the process is going down
+            self.flush()
+    
+    def flush(self):
+        """Export any queued log records now."""
+        if self.enabled:
+            self.log_handler.flush()
 
 
 # Global instance
@@ -1,6 +1,12 @@
+import logging
 import math
+from dataclasses import dataclass, fields
 from typing import List, Tuple, Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import squareform
 from src.models import Image, Cluster
 from src.error_handling import logger
 
@@ -60,107 +66,266 @@ def are_images_proximate(image1: Image, image2: Image,
 
     return gps_ok and time_ok
 
+def _float_column(values: list) -> np.ndarray:
+    """Convert a column to float64 in one call, with NaN for None or unparseable values."""
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return column
+
+def _naive_utc(timestamp) -> Optional[datetime]:
+    """Datetimes as naive UTC for datetime64; anything else counts as missing."""
+    if not isinstance(timestamp, datetime):
+        return None
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+@dataclass
+class ImageCoords:
+    """Structure-of-arrays view of the fields clustering needs, built once per run."""
+    lat: np.ndarray        # degrees, NaN where missing
+    lon: np.ndarray        # degrees, NaN where missing
+    ts: np.ndarray         # datetime64[s], NaT where missing
+    valid_gps: np.ndarray
+    valid_ts: np.ndarray
+    ids: np.ndarray        # int64, -1 for images without an id
+    lat_rad: np.ndarray    # radians and cos(latitude), computed once for the haversine kernel
+    lon_rad: np.ndarray
+    cos_lat: np.ndarray
+
+    @classmethod
+    def from_images(cls, images: List[Image]) -> 'ImageCoords':
+        lat = _float_column([img.latitude for img in images])
+        lon = _float_column([img.longitude for img in images])
+        # One datetime64 conversion for the whole column; None becomes NaT
+        ts = np.array([_naive_utc(img.timestamp) for img in images], dtype='datetime64[s]')
+        ids = np.fromiter((img.id if img.id is not None else -1 for img in images),
+                          dtype=np.int64, count=len(images))
+
+        valid_gps = ~(np.isnan(lat) | np.isnan(lon))
+        lat_rad = np.radians(lat)
+        return cls(lat=lat, lon=lon, ts=ts, valid_gps=valid_gps,
+                   valid_ts=~np.isnat(ts), ids=ids,
+                   lat_rad=lat_rad, lon_rad=np.radians(lon), cos_lat=np.cos(lat_rad))
+
+    def select(self, index) -> 'ImageCoords':
+        """Subset by slice, index array or boolean mask (slices share memory)."""
+        return ImageCoords(**{f.name: getattr(self, f.name)[index] for f in fields(self)})
+
+def _haversine_rad(lat1: np.ndarray, lon1: np.ndarray, cos1: np.ndarray,
+                   lat2: np.ndarray, lon2: np.ndarray, cos2: np.ndarray) -> np.ndarray:
+    """Haversine distance in km over broadcastable arrays of radians and precomputed cos(lat)."""
+    # Work in place so only two broadcast-sized float64 buffers are alive at once
+    distances = np.subtract(lat2, lat1)
+    distances *= 0.5
+    np.sin(distances, out=distances)
+    np.square(distances, out=distances)
+
+    lon_term = np.subtract(lon2, lon1)
+    lon_term *= 0.5
+    np.sin(lon_term, out=lon_term)
+    np.square(lon_term, out=lon_term)
+    lon_term *= cos1
+    lon_term *= cos2
+    distances += lon_term
+    del lon_term
+
+    np.clip(distances, 0.0, 1.0, out=distances)
+    np.sqrt(distances, out=distances)
+    np.arcsin(distances, out=distances)
+    distances *= 2 * 6371.0
+    return distances
+
+def _gps_distance_matrix(coords: ImageCoords) -> np.ndarray:
+    lat, lon, cos_lat, valid = coords.lat_rad, coords.lon_rad, coords.cos_lat, coords.valid_gps
+
+    distances = _haversine_rad(lat[:, None], lon[:, None], cos_lat[:, None],
+                               lat[None, :], lon[None, :], cos_lat[None, :])
+
+    distances[~valid, :] = np.inf
+    distances[:, ~valid] = np.inf
+    return distances
+
+def _time_difference_matrix(coords: ImageCoords) -> np.ndarray:
+    valid = coords.valid_ts
+    # NaT is INT64_MIN; zero it so the subtraction cannot overflow before masking
+    seconds = np.where(valid, coords.ts.astype(np.int64), 0)
+
+    differences = np.abs(np.subtract.outer(seconds, seconds)) / 3600.0
+    differences[~valid, :] = np.inf
+    differences[:, ~valid] = np.inf
+    return differences
+
+def haversine_matrix(images: List[Image]) -> np.ndarray:
+    """Pairwise great-circle distances in km; inf wherever either image lacks GPS."""
+    return _gps_distance_matrix(ImageCoords.from_images(images))
+
+def time_difference_matrix(images: List[Image]) -> np.ndarray:
+    """Pairwise absolute time differences in hours; inf wherever a timestamp is missing."""
+    return _time_difference_matrix(ImageCoords.from_images(images))
+
+def _find_proximate_dense(images: List[Image], coords: ImageCoords,
+                          distance_threshold: float, time_threshold_hours: float) -> List[Tuple[int, int]]:
+    gps_distances = _gps_distance_matrix(coords)
+    time_diffs = _time_difference_matrix(coords)
+
+    # Only the upper triangle, so each pair is reported once as (i, j) with i < j;
+    # np.triu zeroes the mask in place of AND-ing with a separate NxN ones matrix
+    proximate = (gps_distances <= distance_threshold) & (time_diffs <= time_threshold_hours)
+    rows, cols = np.nonzero(np.triu(proximate, k=1))
+
+    ids = [img.id for img in images]
+    return [(ids[i], ids[j]) for i, j in zip(rows.tolist(), cols.tolist())]
+
 def find_proximate_images(images: List[Image],
                          distance_threshold: float = 1.0,
                          time_threshold_hours: float = 2.0) -> List[Tuple[int, int]]:
-    proximate_pairs = []
-
-    # Compare each pair of images
-    for i in range(len(images)):
-        for j in range(i + 1, len(images)):
-            if are_images_proximate(images[i], images[j],
-                                  distance_threshold, time_threshold_hours):
-                proximate_pairs.append((images[i].id, images[j].id))
-
-    return proximate_pairs
+    coords = ImageCoords.from_images(images)
+
+    # Infinite thresholds also match images without GPS/timestamps; only the dense path handles that
+    if not (0 <= distance_threshold < math.inf and 0 <= time_threshold_hours < math.inf):
+        return _find_proximate_dense(images, coords, distance_threshold, time_threshold_hours)
+
+    candidates = np.flatnonzero(coords.valid_gps & coords.valid_ts)
+    if len(candidates) < 2:
+        return []
+
+    lat = coords.lat_rad[candidates]
+    lon = coords.lon_rad[candidates]
+    cos_lat = coords.cos_lat[candidates]
+    seconds = coords.ts[candidates].astype(np.int64)
+
+    # Great-circle distance is monotonic in chord length on the unit sphere, so a KD-tree
+    # radius query over 3-D unit vectors finds every GPS neighbour
+    points = np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+    angle = min(distance_threshold / 6371.0, math.pi)
+    chord = 2 * math.sin(angle / 2) * (1 + 1e-9)
+    pairs = cKDTree(points).query_pairs(chord, output_type='ndarray')
+
+    # Re-check the candidates exactly so results match the haversine thresholds
+    first, second = pairs[:, 0], pairs[:, 1]
+    distances = _haversine_rad(lat[first], lon[first], cos_lat[first],
+                               lat[second], lon[second], cos_lat[second])
+    time_diffs = np.abs(seconds[first] - seconds[second]) / 3600.0
+    keep = (distances <= distance_threshold) & (time_diffs <= time_threshold_hours)
+    first, second = candidates[first[keep]], candidates[second[keep]]
+
+    order = np.lexsort((second, first))
+    return [(images[i].id, images[j].id) for i, j in zip(first[order].tolist(), second[order].tolist())]
 
 def combined_distance(image1: Image, image2: Image,
                      distance_weight: float = 0.6,
-                     time_weight: float = 0.4) -> float:
+                     time_weight: float = 0.4,
+                     early_exit_threshold: Optional[float] = None) -> float:
+    """Weighted GPS/time distance in [0, 1].
 
-    gps_dist = calculate_gps_distance(image1, image2)
+    If the time term alone exceeds early_exit_threshold, the GPS lookup is skipped and an
+    upper bound (time term + distance_weight) is returned; callers only learn the pair is too far.
+    """
     time_diff = calculate_time_difference(image1, image2)
+    if time_diff == float('inf'):
+        time_diff = 1000.0  # Large time difference for missing timestamps
+
+    # Time: 0-24hours maps to 0-1
+    weighted_time = time_weight * min(time_diff / 24.0, 1.0)
+    if early_exit_threshold is not None and weighted_time > early_exit_threshold:
+        return weighted_time + distance_weight
+
+    gps_dist = calculate_gps_distance(image1, image2)
 
     # Normalize distances (handle infinity values)
     if gps_dist == float('inf'):
         gps_dist = 1000.0  # Large distance for missing GPS
-    if time_diff == float('inf'):
-        time_diff = 1000.0  # Large time difference for missing timestamps
 
     # Normalize to 0-1 range (rough approximation)
     # GPS: 0-10km maps to 0-1
     normalized_gps = min(gps_dist / 10.0, 1.0)
-    # Time: 0-24hours maps to 0-1
-    normalized_time = min(time_diff / 24.0, 1.0)
 
     # Weighted combination
-    combined = (distance_weight * normalized_gps) + (time_weight * normalized_time)
+    combined = (distance_weight * normalized_gps) + weighted_time
     return combined
 
+def _combined_distance_matrix(coords: ImageCoords,
+                              distance_weight: float = 0.6,
+                              time_weight: float = 0.4,
+                              early_exit_threshold: Optional[float] = None) -> np.ndarray:
+    # Missing GPS/timestamps are inf, which the normalization caps at 1.0
+    combined = _time_difference_matrix(coords)
+    combined /= 24.0
+    np.minimum(combined, 1.0, out=combined)
+    combined *= time_weight
+
+    if early_exit_threshold is not None:
+        # Pairs whose time term already exceeds the threshold get the worst-case GPS term;
+        # only worth it when that rules out most pairs. The remaining pairs use exact haversine.
+        rows, cols = np.nonzero(np.triu(combined <= early_exit_threshold, k=1))
+        if len(rows) < combined.size // 4:
+            weighted_gps = np.full(rows.shape, distance_weight)
+            valid = coords.valid_gps[rows] & coords.valid_gps[cols]
+            first, second = rows[valid], cols[valid]
+            distances = _haversine_rad(coords.lat_rad[first], coords.lon_rad[first], coords.cos_lat[first],
+                                       coords.lat_rad[second], coords.lon_rad[second], coords.cos_lat[second])
+            weighted_gps[valid] = distance_weight * np.minimum(distances / 10.0, 1.0)
+
+            combined += distance_weight
+            combined[rows, cols] += weighted_gps - distance_weight
+            combined[cols, rows] = combined[rows, cols]
+            # Self-distances as the full computation gives them: 0 unless GPS/time is missing
+            np.fill_diagonal(combined, np.where(coords.valid_ts, 0.0, time_weight) +
+                             np.where(coords.valid_gps, 0.0, distance_weight))
+            return combined
+
+    weighted_gps = _gps_distance_matrix(coords)
+    weighted_gps /= 10.0
+    np.minimum(weighted_gps, 1.0, out=weighted_gps)
+    weighted_gps *= distance_weight
+
+    combined += weighted_gps
+    return combined
+
+def combined_distance_matrix(images: List[Image],
+                             distance_weight: float = 0.6,
+                             time_weight: float = 0.4) -> np.ndarray:
+    """Vectorized combined_distance over every pair of images."""
+    return _combined_distance_matrix(ImageCoords.from_images(images), distance_weight, time_weight)
+
 def hierarchical_cluster_images(images: List[Image],
                                distance_threshold: float = 0.3,
                                max_clusters: Optional[int] = None) -> Dict[int, List[Image]]:
+    """Single-linkage clustering on combined_distance."""
     if not images:
         return {}
 
     if len(images) == 1:
         return {0: images}
 
-    # Initialize each image as its own cluster
-    clusters = {i: [img] for i, img in enumerate(images)}
-    cluster_id_counter = len(images)
-
-    # Calculate initial distance matrix
-    distances = {}
-    for i in range(len(images)):
-        for j in range(i + 1, len(images)):
-            dist = combined_distance(images[i], images[j])
-            distances[(i, j)] = dist
-            distances[(j, i)] = dist
-
-    # Hierarchical clustering using single linkage
-    while len(clusters) > 1:
-        # Find closest pair of clusters
-        min_distance = float('inf')
-        closest_pair = None
-
-        for cid1 in clusters:
-            for cid2 in clusters:
-                if cid1 >= cid2:
-                    continue
-
-                # Find minimum distance between any images in the two clusters
-                cluster_dist = float('inf')
-                for img1 in clusters[cid1]:
-                    for img2 in clusters[cid2]:
-                        idx1 = images.index(img1)
-                        idx2 = images.index(img2)
-                        dist = distances.get((idx1, idx2), float('inf'))
-                        cluster_dist = min(cluster_dist, dist)
-
-                if cluster_dist < min_distance:
-                    min_distance = cluster_dist
-                    closest_pair = (cid1, cid2)
-
-        # Stop if minimum distance exceeds threshold
-        if min_distance > distance_threshold:
-            break
-
-        # Stop if we've reached max_clusters
-        if max_clusters and len(clusters) <= max_clusters:
-            break
-
-        # Merge closest clusters
-        if closest_pair:
-            cid1, cid2 = closest_pair
-            # Merge cluster cid2 into cid1
-            clusters[cid1].extend(clusters[cid2])
-            del clusters[cid2]
-
-    # Convert cluster dict to final format with consecutive IDs
+    # Single linkage on the condensed combined-distance matrix; SciPy merges via the MST
+    coords = ImageCoords.from_images(images)
+    # Heights above the threshold do not change a distance cut, so far-apart pairs can skip
+    # the GPS term; a max_clusters cut needs the exact heights
+    early_exit = None if max_clusters else distance_threshold
+    combined = _combined_distance_matrix(coords, early_exit_threshold=early_exit)
+    condensed = squareform(combined, checks=False)
+    linkage_matrix = linkage(condensed, method='single')
+    labels = fcluster(linkage_matrix, t=distance_threshold, criterion='distance')
+
+    # Never merge below max_clusters
+    if max_clusters and labels.max() < max_clusters:
+        labels = fcluster(linkage_matrix, t=max_clusters, criterion='maxclust')
+
+    # Group by label with consecutive IDs, ordered by each cluster's first image
+    label_to_id = {}
     result = {}
-    for new_id, (old_id, cluster_images) in enumerate(clusters.items()):
-        result[new_id] = cluster_images
+    for img, label in zip(images, labels):
+        cluster_id = label_to_id.setdefault(label, len(label_to_id))
+        result.setdefault(cluster_id, []).append(img)
 
     logger.info(f"Hierarchical clustering completed: {len(images)} images -> {len(result)} clusters")
     return result
@@ -184,11 +349,10 @@ def cluster_images(images: List[Image],
         clusters[0] = []
 
     # Add any unclustered images to cluster 0
-    clustered_image_ids = set()
-    for cluster_images in clusters.values():
-        clustered_image_ids.update(img.id for img in cluster_images)
+    # Track membership by object identity rather than Image.id/equality
+    clustered = {id(img) for cluster_images in clusters.values() for img in cluster_images}
 
-    outliers = [img for img in images if img.id not in clustered_image_ids]
+    outliers = [img for img in images if id(img) not in clustered]
     if outliers:
         if 0 not in clusters:
             clusters[0] = []
@@ -198,26 +362,27 @@ def cluster_images(images: List[Image],
     logger.info(f"Clustering completed: {len(images)} images in {len(clusters)} clusters")
     return clusters
 
-def calculate_cluster_metadata(images: List[Image]) -> Cluster:
+def calculate_cluster_metadata(images: List[Image],
+                               coords: Optional[ImageCoords] = None) -> Cluster:
     if not images:
         return Cluster()
 
-    # Calculate center coordinates
-    valid_coords = [(img.latitude, img.longitude) for img in images
-                   if img.latitude is not None and img.longitude is not None]
+    if coords is None:
+        coords = ImageCoords.from_images(images)
 
-    if valid_coords:
-        avg_lat = sum(lat for lat, lon in valid_coords) / len(valid_coords)
-        avg_lon = sum(lon for lat, lon in valid_coords) / len(valid_coords)
-        center_lat, center_lon = avg_lat, avg_lon
+    # Calculate center coordinates
+    if coords.valid_gps.any():
+        center_lat = float(coords.lat[coords.valid_gps].mean())
+        center_lon = float(coords.lon[coords.valid_gps].mean())
     else:
         center_lat, center_lon = None, None
 
-    # Calculate time range
-    valid_times = [img.timestamp for img in images if img.timestamp is not None]
-    if valid_times:
-        start_time = min(valid_times)
-        end_time = max(valid_times)
+    # Calculate time range; report the images' own datetimes, not the datetime64 copies
+    timed = np.flatnonzero(coords.valid_ts)
+    if len(timed):
+        timestamps = coords.ts[timed]
+        start_time = images[timed[timestamps.argmin()]].timestamp
+        end_time = images[timed[timestamps.argmax()]].timestamp
     else:
         start_time, end_time = None, None
 
@@ -251,21 +416,30 @@ def calculate_cluster_metadata(images: List[Image]) -> Cluster:
 def save_clusters_to_database(clusters: Dict[int, List[Image]]) -> Dict[int, int]:
     from src.database import db
 
-    cluster_id_mapping = {}
+    # One SoA pass over every image; each cluster's metadata reads a contiguous slice
+    all_coords = ImageCoords.from_images([img for images in clusters.values() for img in images])
+    offset = 0
 
-    for cluster_id, images in clusters.items():
+    metadata = []
+    for images in clusters.values():
         # Calculate cluster metadata
-        cluster_metadata = calculate_cluster_metadata(images)
-
-        # Save cluster to database
-        db_cluster_id = db.add_cluster(cluster_metadata)
-        cluster_id_mapping[cluster_id] = db_cluster_id
-
-        # Update all images in this cluster
-        for image in images:
-            db.update_image_cluster(int(image.id or 0), db_cluster_id)
-
-        logger.info(f"Saved cluster {cluster_id} -> DB ID {db_cluster_id} with {len(images)} images")
+        metadata.append(calculate_cluster_metadata(images, all_coords.select(slice(offset, offset + len(images)))))
+        offset += len(images)
+
+    # Save clusters, then every image's assignment, each in a single transaction
+    db_cluster_ids = db.add_clusters_bulk(metadata)
+    cluster_id_mapping = dict(zip(clusters.keys(), db_cluster_ids))
+
+    db.update_image_clusters_bulk([
+        (int(image.id or 0), db_cluster_id)
+        for images, db_cluster_id in zip(clusters.values(), db_cluster_ids)
+        for image in images
+    ])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for cluster_id, images in clusters.items():
+            logger.debug(f"Saved cluster {cluster_id} -> DB ID {cluster_id_mapping[cluster_id]} with {len(images)} images")
+    logger.info(f"Saved {len(db_cluster_ids)} clusters with {offset} images")
 
     return cluster_id_mapping
 
@@ -1,22 +1,45 @@
 import sqlite3
 import os
-from typing import List, Optional
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 from src.models import Image, Cluster, DuplicateGroup
 
 DATABASE_PATH = "album_maker.db"
 
+# Bound parameters per IN (...) query; SQLite builds before 3.32 cap them at 999
+SQLITE_MAX_VARIABLES = 999
+
 class Database:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
+        # One persistent connection shared by all threads; the lock serializes its use
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Per-connection tuning, applied once; WAL itself is persistent and set in init_db
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.execute('PRAGMA mmap_size=268435456')
+        self._conn.execute('PRAGMA cache_size=-65536')
         self.init_db()
 
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+    @contextmanager
+    def get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Hold the lock on the shared connection; commits on success, rolls back on error."""
+        with self._lock, self._conn:
+            yield self._conn
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
 
     def init_db(self):
         """Initialize database tables"""
         with self.get_connection() as conn:
+            # WAL lets the gallery read while the pipeline is writing
+            conn.execute('PRAGMA journal_mode=WAL')
+
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS images (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -29,11 +52,21 @@ class Database:
                     cluster_id INTEGER,
                     is_duplicate BOOLEAN DEFAULT FALSE,
                     duplicate_group INTEGER,
+                    content_hash TEXT,
                     FOREIGN KEY (cluster_id) REFERENCES clusters (id),
                     FOREIGN KEY (duplicate_group) REFERENCES duplicate_groups (id)
                 )
             ''')
 
+            # Migrate databases created before content_hash existed
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(images)')}
+            if 'content_hash' not in columns:
+                conn.execute('ALTER TABLE images ADD COLUMN content_hash TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images (content_hash)')
+            # Duplicate grouping and per-cluster queries filter on these
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_images_hash ON images (hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_images_cluster_id ON images (cluster_id)')
+
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS clusters (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -57,15 +90,33 @@ class Database:
             conn.commit()
 
     # Image operations
+    _INSERT_IMAGE_SQL = '''
+        INSERT INTO images (filename, latitude, longitude, timestamp, blur_score, hash, cluster_id, is_duplicate, duplicate_group, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    @staticmethod
+    def _image_row(image: Image) -> tuple:
+        return (image.filename, image.latitude, image.longitude, image.timestamp, image.blur_score, image.hash, image.cluster_id, image.is_duplicate, image.duplicate_group, image.content_hash)
+
     def add_image(self, image: Image) -> int:
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO images (filename, latitude, longitude, timestamp, blur_score, hash, cluster_id, is_duplicate, duplicate_group)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (image.filename, image.latitude, image.longitude, image.timestamp, image.blur_score, image.hash, image.cluster_id, image.is_duplicate, image.duplicate_group))
+            cursor = conn.execute(self._INSERT_IMAGE_SQL, self._image_row(image))
             conn.commit()
             return cursor.lastrowid or 0
 
+    def add_images_bulk(self, images: List[Image]) -> List[int]:
+        """Insert many images in one transaction and return their new ids in order."""
+        if not images:
+            return []
+        with self.get_connection() as conn:
+            conn.executemany(self._INSERT_IMAGE_SQL, (self._image_row(image) for image in images))
+            # AUTOINCREMENT ids are consecutive within a single write transaction
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            conn.commit()
+            first_id = last_id - len(images) + 1
+            return list(range(first_id, last_id + 1))
+
     def get_image(self, image_id: int) -> Optional[Image]:
         with self.get_connection() as conn:
             row = conn.execute('SELECT * FROM images WHERE id = ?', (image_id,)).fetchone()
@@ -78,40 +129,146 @@ class Database:
             rows = conn.execute('SELECT * FROM images').fetchall()
             return [Image(*row) for row in rows]
 
+    def iter_images(self, batch_size: int = 1000) -> Iterator[Image]:
+        """Yield all images, fetching at most batch_size rows at a time."""
+        with self.get_connection() as conn:
+            cursor = conn.execute('SELECT * FROM images')
+        while True:
+            # Only hold the lock while fetching, not while the caller consumes the batch
+            with self.get_connection():
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield Image(*row)
+
+    def count_images(self) -> int:
+        with self.get_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
     def update_image_cluster(self, image_id: int, cluster_id: int):
         with self.get_connection() as conn:
             conn.execute('UPDATE images SET cluster_id = ? WHERE id = ?', (cluster_id, image_id))
             conn.commit()
 
+    def update_image_clusters_bulk(self, assignments: List[Tuple[int, int]]):
+        """Set cluster_id for many (image_id, cluster_id) pairs in one transaction."""
+        with self.get_connection() as conn:
+            conn.executemany('UPDATE images SET cluster_id = ? WHERE id = ?',
+                             ((cluster_id, image_id) for image_id, cluster_id in assignments))
+            conn.commit()
+
     def update_image_blur_score(self, image_id: int, blur_score: float):
         with self.get_connection() as conn:
             conn.execute('UPDATE images SET blur_score = ? WHERE id = ?', (blur_score, image_id))
             conn.commit()
 
+    def update_blur_scores_bulk(self, scores: List[Tuple[int, float]]):
+        """Update blur scores for many (image_id, blur_score) pairs in one transaction."""
+        with self.get_connection() as conn:
+            conn.executemany('UPDATE images SET blur_score = ? WHERE id = ?',
+                             ((blur_score, image_id) for image_id, blur_score in scores))
+            conn.commit()
+
+    def stored_blur_scores(self, image_ids: List[int]) -> Dict[int, float]:
+        """Blur scores already stored for the given image ids; ids without a score are left out."""
+        scores = {}
+        with self.get_connection() as conn:
+            for start in range(0, len(image_ids), SQLITE_MAX_VARIABLES):
+                chunk = image_ids[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ','.join('?' * len(chunk))
+                scores.update(conn.execute(
+                    f'SELECT id, blur_score FROM images WHERE id IN ({placeholders}) AND blur_score > 0',
+                    chunk).fetchall())
+        return scores
+
+    def update_image_analysis_bulk(self, results: List[Tuple[int, float, str]]):
+        """Update blur score and hash for many (image_id, blur_score, hash) rows in one transaction."""
+        with self.get_connection() as conn:
+            conn.executemany('UPDATE images SET blur_score = ?, hash = ? WHERE id = ?',
+                             ((blur_score, image_hash, image_id) for image_id, blur_score, image_hash in results))
+            conn.commit()
+
+    def find_cached_analyses(self, content_hashes: List[str]) -> Dict[str, Tuple[float, str]]:
+        """Map each content hash that an already analyzed image shares to its (blur_score, hash)."""
+        keys = list({content_hash for content_hash in content_hashes if content_hash})
+        cached = {}
+        with self.get_connection() as conn:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f'''
+                    SELECT content_hash, blur_score, hash FROM images
+                    WHERE content_hash IN ({placeholders}) AND hash IS NOT NULL AND hash != ''
+                ''', chunk)
+                for content_hash, blur_score, image_hash in rows:
+                    cached.setdefault(content_hash, (blur_score, image_hash))
+        return cached
+
     def mark_as_duplicate(self, image_id: int, duplicate_group: int):
         with self.get_connection() as conn:
             conn.execute('UPDATE images SET is_duplicate = TRUE, duplicate_group = ? WHERE id = ?', (duplicate_group, image_id))
             conn.commit()
 
+    def mark_as_duplicates_bulk(self, marks: List[Tuple[int, int]]):
+        """Mark many (image_id, duplicate_group) pairs as duplicates in one transaction."""
+        with self.get_connection() as conn:
+            conn.executemany('UPDATE images SET is_duplicate = TRUE, duplicate_group = ? WHERE id = ?',
+                             ((duplicate_group, image_id) for image_id, duplicate_group in marks))
+            conn.commit()
+
+    _INSERT_DUPLICATE_GROUP_SQL = '''
+        INSERT INTO duplicate_groups (best_image_id, image_ids)
+        VALUES (?, ?)
+    '''
+
     def save_duplicate_group(self, group: DuplicateGroup) -> int:
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO duplicate_groups (best_image_id, image_ids)
-                VALUES (?, ?)
-            ''', (group.best_image_id, group.image_ids))
+            cursor = conn.execute(self._INSERT_DUPLICATE_GROUP_SQL, (group.best_image_id, group.image_ids))
             conn.commit()
             return cursor.lastrowid or 0
 
+    def save_duplicate_groups_bulk(self, groups: List[DuplicateGroup]) -> List[int]:
+        """Insert many duplicate groups in one transaction and return their new ids in order."""
+        if not groups:
+            return []
+        with self.get_connection() as conn:
+            conn.executemany(self._INSERT_DUPLICATE_GROUP_SQL,
+                             ((group.best_image_id, group.image_ids) for group in groups))
+            # AUTOINCREMENT ids are consecutive within a single write transaction
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            conn.commit()
+            first_id = last_id - len(groups) + 1
+            return list(range(first_id, last_id + 1))
+
     # Cluster operations
+    _INSERT_CLUSTER_SQL = '''
+        INSERT INTO clusters (name, center_lat, center_lon, start_time, end_time, image_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+
+    @staticmethod
+    def _cluster_row(cluster: Cluster) -> tuple:
+        return (cluster.name, cluster.center_lat, cluster.center_lon, cluster.start_time, cluster.end_time, cluster.image_count)
+
     def add_cluster(self, cluster: Cluster) -> int:
         with self.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO clusters (name, center_lat, center_lon, start_time, end_time, image_count)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (cluster.name, cluster.center_lat, cluster.center_lon, cluster.start_time, cluster.end_time, cluster.image_count))
+            cursor = conn.execute(self._INSERT_CLUSTER_SQL, self._cluster_row(cluster))
             conn.commit()
             return cursor.lastrowid or 0
 
+    def add_clusters_bulk(self, clusters: List[Cluster]) -> List[int]:
+        """Insert many clusters in one transaction and return their new ids in order."""
+        if not clusters:
+            return []
+        with self.get_connection() as conn:
+            conn.executemany(self._INSERT_CLUSTER_SQL, (self._cluster_row(cluster) for cluster in clusters))
+            # AUTOINCREMENT ids are consecutive within a single write transaction
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            conn.commit()
+            first_id = last_id - len(clusters) + 1
+            return list(range(first_id, last_id + 1))
+
     def get_cluster(self, cluster_id: int) -> Optional[Cluster]:
         with self.get_connection() as conn:
             row = conn.execute('SELECT * FROM clusters WHERE id = ?', (cluster_id,)).fetchone()
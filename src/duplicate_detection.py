@@ -1,35 +1,84 @@
+import json
 import logging
-from typing import List, Dict, Set
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
 from collections import defaultdict
+from operator import attrgetter
 
 from .models import Image, DuplicateGroup
-from .image_processing import detect_blur
+from .image_processing import detect_blur, load_gray
 from .database import Database
 
 logger = logging.getLogger(__name__)
 
-def calculate_blur_scores(images: List[Image]) -> List[Image]:
-    updated_images = []
-
-    for img in images:
-        if img.blur_score == 0.0:  # Only calculate if not already done
-            try:
-                # Load image from file to calculate blur score
-                from PIL import Image as PILImage
-                pil_image = PILImage.open(img.filename)
-                img.blur_score = detect_blur(pil_image)
-                pil_image.close()
-                logger.info(f"Calculated blur score for {img.filename}: {img.blur_score:.3f}")
-            except Exception as e:
-                logger.warning(f"Failed to calculate blur score for {img.filename}: {e}")
-                img.blur_score = 0.5  # Default neutral score
-
-        updated_images.append(img)
-
-    return updated_images
+def _blur_for_path(path: str) -> float:
+    """Worker: decode one file and return its blur score (runs in a child process)."""
+    # The Laplacian only needs luma; decode straight to it
+    return detect_blur(load_gray(path))
+
+# Files scored per worker task; amortizes pickling/IPC over several decodes
+BLUR_CHUNK_SIZE = 8
+
+def _blur_for_paths(paths: List[str]) -> List[Tuple[Optional[float], Optional[str]]]:
+    """Worker: (score, error) per file for a chunk, so one bad file doesn't fail the chunk."""
+    results = []
+    for path in paths:
+        try:
+            results.append((_blur_for_path(path), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+def calculate_blur_scores(images: List[Image], db: Optional[Database] = None) -> List[Image]:
+    # Only calculate if not already done
+    pending = [img for img in images if img.blur_score == 0.0]
+
+    if db is not None and pending:
+        # A score already stored for the image is reused instead of decoding the file again
+        stored = db.stored_blur_scores([img.id for img in pending if img.id is not None])
+        still_pending = []
+        for img in pending:
+            if img.id in stored:
+                img.blur_score = stored[img.id]
+            else:
+                still_pending.append(img)
+        pending = still_pending
+
+    if pending:
+        failed = 0
+        log_each = logger.isEnabledFor(logging.DEBUG)
+        # Decode + blur is independent per file, so spread it over worker
+        # processes, a chunk of files per task (smaller chunks for small
+        # batches so every worker still gets some)
+        workers = min(len(pending), os.cpu_count() or 1)
+        chunk_size = max(1, min(BLUR_CHUNK_SIZE, len(pending) // workers))
+        chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_blur_for_paths, [img.filename for img in chunk]) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = [(None, str(e))] * len(chunk)
+                for img, (score, error) in zip(chunk, results):
+                    if error is None:
+                        img.blur_score = score
+                        if log_each:
+                            logger.debug(f"Calculated blur score for {img.filename}: {img.blur_score:.3f}")
+                    else:
+                        logger.warning(f"Failed to calculate blur score for {img.filename}: {error}")
+                        img.blur_score = 0.5  # Default neutral score
+                        failed += 1
+        logger.info(f"Calculated {len(pending) - failed} blur scores ({failed} failed, "
+                    f"{len(images) - len(pending)} already known)")
+
+    return list(images)
 
 def greedy_select_best_images(images: List[Image], similarity_threshold: float = 0.9) -> Dict[int, List[Image]]:
-    # Group images by hash similarity (simplified - using exact hash match for now)
+    # Group images by hash similarity (simplified - using exact hash match for now).
+    # Bucketing by hash keeps this a single linear pass; near-duplicate matching
+    # is left to the graph-based detector.
     hash_groups = defaultdict(list)
 
     for img in images:
@@ -43,13 +92,14 @@ def greedy_select_best_images(images: List[Image], similarity_threshold: float =
     for hash_value, group_images in hash_groups.items():
         if len(group_images) > 1:
             # Sort by blur score (highest = sharpest first)
-            sorted_images = sorted(group_images, key=lambda x: x.blur_score, reverse=True)
+            sorted_images = sorted(group_images, key=attrgetter('blur_score'), reverse=True)
 
             duplicate_groups[group_id] = sorted_images
             group_id += 1
 
-            logger.info(f"Found duplicate group {group_id-1}: {len(sorted_images)} images, "
-                       f"best blur score: {sorted_images[0].blur_score:.3f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Found duplicate group {group_id-1}: {len(sorted_images)} images, "
+                             f"best blur score: {sorted_images[0].blur_score:.3f}")
 
     return duplicate_groups
 
@@ -58,7 +108,7 @@ def filter_blurred_duplicates(images: List[Image], db: Database,
     logger.info("Starting blur filtering and duplicate detection...")
 
     # Step 1: Calculate blur scores for all images
-    images_with_blur = calculate_blur_scores(images)
+    images_with_blur = calculate_blur_scores(images, db)
     logger.info(f"Calculated blur scores for {len(images_with_blur)} images")
 
     # Step 2: Group duplicates and select best images
@@ -67,51 +117,53 @@ def filter_blurred_duplicates(images: List[Image], db: Database,
 
     # Step 3: Mark duplicates and save to database
     filtered_images = []
+    processed_hashes = set()
     duplicate_group_id = 1
+    marked_count = 0
+    marks = []
+    groups_to_save = []
 
+    # Groups come back from greedy_select_best_images already sorted sharpest first
     for group_images in duplicate_groups.values():
-        # Sort by blur score (highest first)
-        sorted_group = sorted(group_images, key=lambda x: x.blur_score, reverse=True)
+        processed_hashes.add(group_images[0].hash)
 
         # Keep the sharpest image
-        best_image = sorted_group[0]
+        best_image = group_images[0]
         best_image.is_duplicate = False
         best_image.duplicate_group = duplicate_group_id
         filtered_images.append(best_image)
 
         # Mark others as duplicates
         duplicate_image_ids = []
-        for img in sorted_group[1:]:
+        for img in group_images[1:]:
             img.is_duplicate = True
             img.duplicate_group = duplicate_group_id
             duplicate_image_ids.append(img.id)
+            marks.append((img.id or 0, duplicate_group_id))
 
-            # Update in database
-            db.mark_as_duplicate(img.id or 0, duplicate_group_id)
-
-        # Save duplicate group to database
-        duplicate_group = DuplicateGroup(
+        groups_to_save.append(DuplicateGroup(
             id=duplicate_group_id,
             best_image_id=best_image.id,
-            image_ids=str(duplicate_image_ids)
-        )
-        db.save_duplicate_group(duplicate_group)
+            image_ids=json.dumps(duplicate_image_ids)
+        ))
 
-        logger.info(f"Duplicate group {duplicate_group_id}: kept {best_image.filename} "
-                   f"(blur: {best_image.blur_score:.3f}), marked {len(duplicate_image_ids)} as duplicates")
+        marked_count += len(duplicate_image_ids)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Duplicate group {duplicate_group_id}: kept {best_image.filename} "
+                         f"(blur: {best_image.blur_score:.3f}), marked {len(duplicate_image_ids)} as duplicates")
         duplicate_group_id += 1
 
-    # Step 4: Add non-duplicate images
-    processed_hashes = set()
-    for group_images in duplicate_groups.values():
-        for img in group_images:
-            processed_hashes.add(img.hash)
+    # Update the database in one transaction per table
+    db.mark_as_duplicates_bulk(marks)
+    db.save_duplicate_groups_bulk(groups_to_save)
 
+    # Step 4: Add non-duplicate images
     for img in images_with_blur:
         if img.hash not in processed_hashes:
             filtered_images.append(img)
 
-    logger.info(f"Blur filtering complete: {len(images)} -> {len(filtered_images)} images")
+    logger.info(f"Blur filtering complete: {len(images)} -> {len(filtered_images)} images "
+                f"({marked_count} marked as duplicates in {len(duplicate_groups)} groups)")
 
     return filtered_images
 
@@ -122,9 +174,8 @@ def process_blur_filtering(images: List[Image], db: Database,
         filtered_images = filter_blurred_duplicates(images, db, blur_threshold)
 
         # Update database with filtered results
-        for img in filtered_images:
-            if not img.is_duplicate:
-                db.update_image_blur_score(img.id or 0, img.blur_score)
+        db.update_blur_scores_bulk([(img.id or 0, img.blur_score)
+                                    for img in filtered_images if not img.is_duplicate])
 
         stats = {
             "original_images": len(images),
@@ -1,45 +1,358 @@
+import json
 import logging
-from typing import List, Dict, Set, Tuple, Any
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import List, Dict, Set, Tuple, Any, Union, Sequence, Iterator, Optional
 import networkx as nx
+import numpy as np
 import imagehash
+from scipy.fft import dct
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 from PIL import Image as PILImage
 
-from .models import Image, DuplicateGroup
+from .models import Image, DuplicateGroup, hash_to_int
 from .database import Database
+from .image_processing import analyze_file
 
 logger = logging.getLogger(__name__)
 
-def calculate_perceptual_hash(image_path: str) -> Dict[str, imagehash.ImageHash]:
-    try:
-        img = PILImage.open(image_path)
-        
-        hashes = {
-            'ahash': imagehash.average_hash(img),
-            'phash': imagehash.phash(img),
-            'dhash': imagehash.dhash(img),
-        }
-        
-        img.close()
-        logger.debug(f"Calculated hashes for {image_path}: {hashes}")
-        return hashes
-        
-    except Exception as e:
-        logger.error(f"Failed to calculate hash for {image_path}: {e}")
-        raise
+def _average_hash(gray: PILImage.Image, hash_size: int = 8) -> imagehash.ImageHash:
+    pixels = np.asarray(gray.resize((hash_size, hash_size), PILImage.Resampling.LANCZOS))
+    return imagehash.ImageHash(pixels > pixels.mean())
+
+def _perceptual_hash(gray: PILImage.Image, hash_size: int = 8, highfreq_factor: int = 4) -> imagehash.ImageHash:
+    img_size = hash_size * highfreq_factor
+    pixels = np.asarray(gray.resize((img_size, img_size), PILImage.Resampling.LANCZOS), dtype=np.float64)
+    # Same unnormalized 2D DCT-II as imagehash (scipy.fftpack), via pocketfft
+    dct_lowfreq = dct(dct(pixels, axis=0), axis=1)[:hash_size, :hash_size]
+    return imagehash.ImageHash(dct_lowfreq > np.median(dct_lowfreq))
+
+def _difference_hash(gray: PILImage.Image, hash_size: int = 8) -> imagehash.ImageHash:
+    pixels = np.asarray(gray.resize((hash_size + 1, hash_size), PILImage.Resampling.LANCZOS))
+    return imagehash.ImageHash(pixels[:, 1:] > pixels[:, :-1])
+
+_HASH_FUNCTIONS = {
+    'ahash': _average_hash,
+    'phash': _perceptual_hash,
+    'dhash': _difference_hash,
+}
+
+def _hash_gray(img: PILImage.Image, from_file: bool) -> PILImage.Image:
+    """Grayscale image the hashes are computed from, shrunk cheaply first when read from a file."""
+    if from_file and img.format == 'JPEG':
+        # Let libjpeg downscale in the DCT domain while decoding; the
+        # hashes never look at more than 32x32 pixels
+        img.draft('L', (64, 64))
+    
+    # Convert to grayscale once and share it between the three hashes
+    # (imagehash converts again inside each one); for images passed in,
+    # results are identical to imagehash.average_hash / phash / dhash
+    gray = img if img.mode == 'L' else img.convert('L')
+    if from_file and img.format != 'JPEG' and min(gray.size) >= 128:
+        # Shared downsample for formats without a draft mode: one box
+        # reduction, capped at 1/8 like libjpeg's, so each hash's LANCZOS
+        # resize runs on a thumbnail instead of the full frame
+        gray = gray.reduce(min(8, min(gray.size) // 64))
+    return gray
+
+def calculate_perceptual_hash(image: Union[str, PILImage.Image],
+                              kinds: Sequence[str] = ('ahash', 'phash', 'dhash')) -> Dict[str, imagehash.ImageHash]:
+    # Accept an already decoded image so callers that also need the pixels
+    # (e.g. blur detection) don't decode the file a second time. Only the
+    # hash kinds asked for are computed (the phash DCT is the costly one)
+    # Decode errors propagate; callers that batch over many files catch and
+    # log them per image
+    with ExitStack() as stack:
+        if isinstance(image, str):
+            gray = _hash_gray(stack.enter_context(PILImage.open(image)), from_file=True)
+        else:
+            gray = _hash_gray(image, from_file=False)
+        hashes = {kind: _HASH_FUNCTIONS[kind](gray) for kind in kinds}
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        source = image if isinstance(image, str) else getattr(image, 'filename', '') or 'image'
+        logger.debug(f"Calculated hashes for {source}: {hashes}")
+    return hashes
 
 def calculate_hash_distance(hash1: str, hash2: str) -> int:
-    try:
-        # Convert hex strings back to ImageHash objects
-        h1 = imagehash.hex_to_hash(hash1)
-        h2 = imagehash.hex_to_hash(hash2)
+    """
+    Hamming distance between two hex hashes of the same length.
+
+    For one-off comparisons; batch work should go through hashes_to_u64()
+    and pairwise_hamming_below(), which validate every hash once and do
+    the XOR + popcount inline over arrays.
+    """
+    value1 = hash_to_int(hash1)
+    value2 = hash_to_int(hash2)
+    if value1 is None or value2 is None:
+        logger.warning(f"Failed to calculate hash distance: invalid hash {hash1!r} / {hash2!r}")
+        return 999  # Large distance for invalid hashes
+    if len(hash1) != len(hash2):
+        logger.warning(f"Failed to calculate hash distance: hash sizes differ ({len(hash1)} vs {len(hash2)} hex digits)")
+        return 999  # Large distance for invalid hashes
+    
+    # Hamming distance is the popcount of the XOR
+    return (value1 ^ value2).bit_count()
+
+def hashes_to_u64(images: List[Image]) -> Tuple[List[List[int]], List[np.ndarray]]:
+    """
+    Parse hex hashes once into uint64 arrays for vectorized comparison.
+
+    Hashes are grouped by hex length so that only hashes of the same size
+    are compared (as with imagehash, different sizes are never similar).
+    Hashes of up to 64 bits become an (N,) array; wider ones (e.g. a
+    256-bit phash with hash_size=16) become (N, words) arrays of 64-bit
+    words, most significant word first. Images without a hash or with
+    invalid hex are left out.
+
+    Returns:
+        Parallel lists of (indices into images, uint64 hash array) per group
+    """
+    groups: Dict[int, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+    for idx, img in enumerate(images):
+        if not img.hash:
+            continue
+        value = hash_to_int(img.hash)
+        if value is None:
+            logger.warning(f"Skipping invalid hash for {img.filename}: {img.hash!r}")
+            continue
+        indices, values = groups[len(img.hash)]
+        indices.append(idx)
+        values.append(value)
+
+    index_groups = []
+    hash_arrays = []
+    for hex_length, (indices, values) in groups.items():
+        index_groups.append(indices)
+        if hex_length <= 16:
+            hash_arrays.append(np.array(values, dtype=np.uint64))
+        else:
+            words = -(-hex_length // 16)
+            packed = b''.join(value.to_bytes(words * 8, 'big') for value in values)
+            hash_arrays.append(np.frombuffer(packed, dtype='>u8').astype(np.uint64).reshape(-1, words))
+    return index_groups, hash_arrays
+
+@dataclass
+class ImageBatch:
+    """
+    Structure-of-arrays view of the fields the duplicate search reads.
+
+    Hashes are parsed and blur scores gathered once into contiguous arrays,
+    so grouping and best-image ordering run on NumPy instead of touching
+    every Image object; results map back to the Image list by index.
+    """
+    blur: np.ndarray  # (N,) float64 blur scores, as on the models
+    hash_indices: List[List[int]]  # Per hash size: indices into the batch
+    hash_arrays: List[np.ndarray]  # Per hash size: uint64 hashes, see hashes_to_u64()
+
+    @classmethod
+    def from_images(cls, images: List[Image]) -> 'ImageBatch':
+        hash_indices, hash_arrays = hashes_to_u64(images)
+        blur = np.array([img.blur_score for img in images], dtype=np.float64)
+        return cls(blur, hash_indices, hash_arrays)
+
+    def __len__(self) -> int:
+        return len(self.blur)
+
+# Working-set budget for one block of pairwise_hamming_below (XOR, popcount
+# and mask buffers); sized to stay resident in a typical per-core L2 cache so
+# the scan is bound by popcount throughput rather than memory bandwidth
+HAMMING_BLOCK_BYTES = 1 << 20
+
+def _iter_hamming_blocks(hashes: np.ndarray, threshold: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Brute-force upper-triangle scan, yielding the pairs found per block.
+
+    Rows are processed in blocks, each compared only with the hashes from
+    its first row onwards. The XOR, popcount and threshold write into
+    buffers allocated once for the whole scan and sized by
+    HAMMING_BLOCK_BYTES; np.bitwise_count maps to the hardware popcount
+    instruction. Consumers that fold pairs as they arrive (see
+    group_similar_images) never hold more than one block of them.
+    """
+    n = len(hashes)
+    # Wide hashes are (N, words); their distances can exceed 255
+    words = hashes.shape[1] if hashes.ndim == 2 else 1
+    count_dtype = np.uint8 if hashes.ndim == 1 else np.uint16
+    if n == 0:
+        return
+    
+    # uint64 XOR + uint8 count per word, then the per-pair count and bool mask
+    pair_bytes = 9 * words + (1 if hashes.ndim == 1 else 3)
+    block_size = min(max(1, HAMMING_BLOCK_BYTES // (pair_bytes * n)), n)
+    xor_buffer = np.empty((block_size, n) + hashes.shape[1:], dtype=np.uint64)
+    word_count_buffer = np.empty(xor_buffer.shape, dtype=np.uint8) if hashes.ndim == 2 else None
+    count_buffer = np.empty((block_size, n), dtype=count_dtype)
+    mask_buffer = np.empty((block_size, n), dtype=bool)
+    
+    for start in range(0, n, block_size):
+        block = hashes[start:start + block_size]
+        xor = xor_buffer[:len(block), :n - start]
+        counts = count_buffer[:len(block), :n - start]
+        mask = mask_buffer[:len(block), :n - start]
+        np.bitwise_xor(block[:, None], hashes[None, start:], out=xor)
+        if word_count_buffer is None:
+            np.bitwise_count(xor, out=counts)
+        else:
+            word_counts = word_count_buffer[:len(block), :n - start]
+            np.bitwise_count(xor, out=word_counts)
+            np.sum(word_counts, axis=-1, dtype=count_dtype, out=counts)
+        np.less_equal(counts, threshold, out=mask)
         
-        # Calculate Hamming distance
-        distance = h1 - h2
-        return distance
+        block_rows, block_cols = np.nonzero(mask)
+        upper = block_cols > block_rows
+        block_rows, block_cols = block_rows[upper], block_cols[upper]
+        yield block_rows + start, block_cols + start, counts[block_rows, block_cols]
+
+# Use the band prefilter only when it leaves at most this share of all pairs
+BAND_MAX_CANDIDATE_FRACTION = 0.125
+# Below this many hashes a single brute-force block beats building the bands
+BAND_MIN_HASHES = 256
+# Candidate pairs materialized at once per band, bounding memory regardless of run sizes
+BAND_PAIR_CHUNK = 1 << 18
+
+def _band_values(hashes: np.ndarray, threshold: int) -> Optional[List[np.ndarray]]:
+    """
+    Split 64-bit hashes into threshold + 1 bit bands, if that is selective.
+
+    Pigeonhole makes the prefilter exact: two hashes within the threshold
+    differ in at most `threshold` bits, so at least one of the threshold + 1
+    disjoint bands is identical. Returns the per-band values, or None when
+    same-band collisions would still cover more than
+    BAND_MAX_CANDIDATE_FRACTION of all pairs (large thresholds, or tightly
+    clustered hashes) and the brute-force scan is cheaper, or when there
+    are fewer than BAND_MIN_HASHES hashes to index.
+    """
+    n = len(hashes)
+    if hashes.ndim != 1 or n < BAND_MIN_HASHES:
+        return None
+    # Bits above the widest hash are zero everywhere and never differ
+    width = int(hashes.max()).bit_length()
+    band_count = threshold + 1
+    if band_count > width:
+        return None
+    
+    edges = np.linspace(0, width, band_count + 1).round().astype(int)
+    bands = []
+    candidates = 0
+    for low, high in zip(edges[:-1].tolist(), edges[1:].tolist()):
+        values = (hashes >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        counts = np.unique(values, return_counts=True)[1].astype(np.int64)
+        candidates += int((counts * (counts - 1) // 2).sum())
+        bands.append(values)
+    if candidates > BAND_MAX_CANDIDATE_FRACTION * n * (n - 1) / 2:
+        return None
+    return bands
+
+def _iter_band_pairs(hashes: np.ndarray, bands: List[np.ndarray],
+                     threshold: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Exact pairs within the threshold among same-band candidates, one band at a time.
+
+    A candidate is emitted only from the first band its two hashes share,
+    so every pair appears once without a global dedupe. Candidates are
+    generated in chunks of about BAND_PAIR_CHUNK pairs (never splitting one
+    position's partners), so large runs of equal band values do not
+    materialize a whole band's candidates at once.
+    """
+    for band_index, values in enumerate(bands):
+        # Runs of equal band values; pair every position with the rest of its run
+        order = np.argsort(values, kind='stable')
+        sorted_values = values[order]
+        run_starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+        run_ends = np.r_[run_starts[1:], len(order)]
+        run_end = np.repeat(run_ends, run_ends - run_starts)
+        partners = run_end - np.arange(len(order)) - 1
+        pair_starts = np.cumsum(partners) - partners
+        chunk_ids = pair_starts // BAND_PAIR_CHUNK
+        chunk_bounds = np.r_[0, np.flatnonzero(chunk_ids[1:] != chunk_ids[:-1]) + 1, len(order)]
         
-    except Exception as e:
-        logger.warning(f"Failed to calculate hash distance: {e}")
-        return 999  # Large distance for invalid hashes
+        for low, high in zip(chunk_bounds[:-1].tolist(), chunk_bounds[1:].tolist()):
+            chunk_partners = partners[low:high]
+            positions = np.repeat(np.arange(low, high), chunk_partners)
+            offsets = (np.arange(len(positions)) + pair_starts[low]
+                       - np.repeat(pair_starts[low:high], chunk_partners))
+            first, second = order[positions], order[positions + offsets + 1]
+            if not len(first):
+                continue
+            
+            keep = np.ones(len(first), dtype=bool)
+            for earlier in bands[:band_index]:
+                keep &= earlier[first] != earlier[second]
+            first, second = first[keep], second[keep]
+            
+            distances = np.bitwise_count(hashes[first] ^ hashes[second])
+            close = distances <= threshold
+            first, second = first[close], second[close]
+            yield np.minimum(first, second), np.maximum(first, second), distances[close]
+
+def _iter_similar_pairs(hashes: np.ndarray, threshold: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """(rows, cols, distances) chunks of all pairs within the threshold, row < col, in no particular order."""
+    bands = _band_values(hashes, threshold)
+    if bands is None:
+        return _iter_hamming_blocks(hashes, threshold)
+    return _iter_band_pairs(hashes, bands, threshold)
+
+def _hamming_scan(hashes: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All pairs from _iter_similar_pairs() as (rows, cols, distances) arrays in row-major order."""
+    chunks = list(_iter_similar_pairs(hashes, threshold))
+    if not chunks:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.uint8 if hashes.ndim == 1 else np.uint16)
+    rows, cols, distances = (np.concatenate(parts) for parts in zip(*chunks))
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], distances[order]
+
+def pairwise_hamming_below(hashes: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs of hashes within a Hamming distance threshold.
+
+    Identical hashes (bursts, copies of the same file) are collapsed first,
+    like the zero-distance bucket of a BK-tree node: only distinct values
+    go through the quadratic scan, and their pairs are expanded back to
+    every image sharing each value.
+
+    Args:
+        hashes: (N,) uint64 hashes, or (N, words) for hashes wider than 64 bits
+        threshold: Maximum Hamming distance for a pair to be reported
+
+    Returns:
+        Tuple of (row indices, column indices, distances) with row < column,
+        in row-major order
+    """
+    unique, inverse, counts = np.unique(hashes, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    if len(unique) == len(hashes):
+        return _hamming_scan(hashes, threshold)
+    
+    # Pairs of distinct values, plus each repeated value paired with itself
+    rows, cols, distances = _hamming_scan(unique, threshold)
+    repeated = np.nonzero(counts > 1)[0]
+    rows = np.concatenate([rows, repeated])
+    cols = np.concatenate([cols, repeated])
+    distances = np.concatenate([distances, np.zeros(len(repeated), dtype=distances.dtype)])
+    
+    # Cartesian product of the member lists of each value pair
+    members = np.argsort(inverse, kind='stable')
+    starts = np.cumsum(counts) - counts
+    sizes = counts[rows] * counts[cols]
+    pair = np.repeat(np.arange(len(rows)), sizes)
+    offsets = np.arange(len(pair)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    col_counts = counts[cols][pair]
+    first = members[starts[rows][pair] + offsets // col_counts]
+    second = members[starts[cols][pair] + offsets % col_counts]
+    
+    # A value paired with itself yields both orders and self pairs; keep i < j
+    keep = (rows != cols)[pair] | (first < second)
+    first, second, pair_distances = first[keep], second[keep], distances[pair][keep]
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    
+    order = np.lexsort((high, low))
+    return low[order], high[order], pair_distances[order]
 
 def build_similarity_graph(images: List[Image], similarity_threshold: int = 10) -> nx.Graph:
     logger.info(f"Building similarity graph for {len(images)} images (threshold: {similarity_threshold})")
@@ -47,44 +360,68 @@ def build_similarity_graph(images: List[Image], similarity_threshold: int = 10)
     G = nx.Graph()
     
     # Add all images as nodes
-    for img in images:
-        G.add_node(img.id, image=img)
-    
-    # Compare all pairs and add edges for similar images
-    edge_count = 0
-    for i, img1 in enumerate(images):
-        for img2 in images[i+1:]:
-            if not img1.hash or not img2.hash:
-                continue
-                
-            # Calculate hash distance
-            distance = calculate_hash_distance(img1.hash, img2.hash)
-            
-            # Add edge if similar enough
-            if distance <= similarity_threshold:
-                # Weight is inverse of distance (higher weight = more similar)
-                weight = 1.0 / (distance + 1)  # +1 to avoid division by zero
-                G.add_edge(img1.id, img2.id, weight=weight, distance=distance)
-                edge_count += 1
-                logger.debug(f"Similar images: {img1.filename} <-> {img2.filename} (distance: {distance})")
+    G.add_nodes_from((img.id, {'image': img}) for img in images)
+    
+    # Pairwise Hamming distances in one vectorized scan per hash size
+    for indices, hashes in zip(*hashes_to_u64(images)):
+        rows, cols, distances = pairwise_hamming_below(hashes, similarity_threshold)
+        edge_distances = distances.astype(np.int64)
+        # Weight is inverse of distance (higher weight = more similar)
+        edge_weights = 1.0 / (edge_distances + 1)  # +1 to avoid division by zero
+        
+        ids = np.array([images[idx].id for idx in indices], dtype=object)
+        G.add_edges_from(
+            (id1, id2, {'weight': weight, 'distance': distance})
+            for id1, id2, weight, distance in zip(ids[rows].tolist(), ids[cols].tolist(),
+                                                  edge_weights.tolist(), edge_distances.tolist())
+        )
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, j, distance in zip(rows.tolist(), cols.tolist(), edge_distances.tolist()):
+                logger.debug(f"Similar images: {images[indices[i]].filename} <-> {images[indices[j]].filename} (distance: {distance})")
     
     logger.info(f"Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     return G
 
+def _graph_csr(graph: nx.Graph) -> Tuple[List[Any], csr_matrix]:
+    """
+    Node list and symmetric CSR adjacency of a graph, built in one pass.
+
+    Row i of the matrix holds the neighbours of nodes[i] (indices[indptr[i]:
+    indptr[i + 1]]), so traversals and degree counts become array slices
+    instead of per-node NetworkX dict lookups.
+    """
+    nodes = list(graph.nodes)
+    node_index = {node_id: idx for idx, node_id in enumerate(nodes)}
+    ends = np.fromiter((node_index[node] for edge in graph.edges() for node in edge),
+                       dtype=np.intp, count=2 * graph.number_of_edges()).reshape(-1, 2)
+    rows = np.concatenate([ends[:, 0], ends[:, 1]])
+    cols = np.concatenate([ends[:, 1], ends[:, 0]])
+    adjacency = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                           shape=(len(nodes), len(nodes)))
+    return nodes, adjacency
+
 def find_connected_duplicate_groups(graph: nx.Graph) -> List[List[Image]]:
     logger.info("Finding connected components for duplicate groups...")
     
-    # Find all connected components
-    components = nx.connected_components(graph)
+    # Find all connected components with SciPy's C graph traversal over a
+    # CSR adjacency matrix instead of walking NetworkX's dict-of-dicts
+    nodes, adjacency = _graph_csr(graph)
+    _, labels = connected_components(adjacency, directed=False)
+    
+    # Node indices grouped by component label, each group in node order
+    order = np.argsort(labels, kind='stable')
+    components = np.split(order, np.cumsum(np.bincount(labels))[:-1]) if len(nodes) else []
     
     duplicate_groups = []
     component_count = 0
+    log_each = logger.isEnabledFor(logging.DEBUG)
     
     for component in components:
         # Only consider groups with 2+ images as duplicates
         if len(component) >= 2:
             # Get all images in this component
-            group_images = [graph.nodes[node_id]['image'] for node_id in component]
+            group_images = [graph.nodes[nodes[idx]]['image'] for idx in component.tolist()]
             
             # Sort by blur score (best quality first)
             group_images.sort(key=lambda x: x.blur_score, reverse=True)
@@ -92,12 +429,117 @@ def find_connected_duplicate_groups(graph: nx.Graph) -> List[List[Image]]:
             duplicate_groups.append(group_images)
             component_count += 1
             
-            logger.info(f"Duplicate group {component_count}: {len(group_images)} images, "
-                       f"best blur score: {group_images[0].blur_score:.3f}")
+            if log_each:
+                logger.debug(f"Duplicate group {component_count}: {len(group_images)} images, "
+                             f"best blur score: {group_images[0].blur_score:.3f}")
     
     logger.info(f"Found {len(duplicate_groups)} duplicate groups via connected components")
     return duplicate_groups
 
+# Pending edges group_similar_images() holds before folding them into the
+# component labels (at least one per image, so each fold is amortized)
+COMPONENT_MERGE_EDGES = 1 << 18
+
+def _merge_components(representative: np.ndarray, rows: List[np.ndarray], cols: List[np.ndarray]) -> np.ndarray:
+    """
+    Fold extra edges into a component labeling.
+
+    The current labels enter the CSR adjacency as one edge per node (node ->
+    its representative), so SciPy's connected_components over them plus the
+    new edges yields the merged components in one C traversal.
+
+    Args:
+        representative: (N,) smallest node index of each node's component
+        rows, cols: Chunks of node indices of the new edges
+
+    Returns:
+        (N,) smallest node index of each node's merged component
+    """
+    n = len(representative)
+    nodes = np.arange(n)
+    sources = np.concatenate([nodes, *rows])
+    targets = np.concatenate([representative, *cols])
+    adjacency = csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n, n))
+    _, labels = connected_components(adjacency, directed=False)
+    # Writing in reverse leaves each label's smallest node
+    smallest = np.empty(labels.max() + 1 if n else 0, dtype=np.intp)
+    smallest[labels[::-1]] = nodes[::-1]
+    return smallest[labels]
+
+def group_similar_images(images: List[Image], similarity_threshold: int = 10) -> Tuple[List[List[Image]], int]:
+    """
+    Duplicate groups straight from the pair scan, without building a graph.
+
+    Same groups as find_connected_duplicate_groups(build_similarity_graph(...)),
+    but pairs found by the scan are buffered and folded into the component
+    labels with SciPy's connected_components every COMPONENT_MERGE_EDGES
+    edges, so the full edge list is never materialized (memory stays O(N)
+    plus one buffer). Images sharing an identical hash are joined up front
+    and only distinct hash values are scanned.
+
+    Args:
+        images: Images with hex hashes
+        similarity_threshold: Maximum Hamming distance for two images to be similar
+
+    Returns:
+        Tuple of (groups of 2+ images sorted by blur score, number of similar pairs)
+    """
+    logger.info(f"Grouping {len(images)} images by hash similarity (threshold: {similarity_threshold})")
+    
+    batch = ImageBatch.from_images(images)
+    roots = np.arange(len(batch))
+    merge_edges = max(len(batch), COMPONENT_MERGE_EDGES)
+    pending_rows, pending_cols, pending = [], [], 0
+    pair_count = 0
+    for indices, hashes in zip(batch.hash_indices, batch.hash_arrays):
+        indices = np.asarray(indices, dtype=np.intp)
+        unique, inverse, counts = np.unique(hashes, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        
+        # Images with the same value are all pairwise similar (distance 0);
+        # join each one to the first image holding its value
+        first = np.empty(len(unique), dtype=np.intp)
+        first[inverse[::-1]] = np.arange(len(inverse))[::-1]
+        pair_count += int((counts * (counts - 1) // 2).sum())
+        pending_rows.append(indices)
+        pending_cols.append(indices[first[inverse]])
+        pending += len(indices)
+        
+        # Similar distinct values: one edge per value pair, counting every
+        # image pair it stands for
+        for rows, cols, _ in _iter_similar_pairs(unique, similarity_threshold):
+            pair_count += int((counts[rows] * counts[cols]).sum())
+            pending_rows.append(indices[first[rows]])
+            pending_cols.append(indices[first[cols]])
+            pending += len(rows)
+            if pending >= merge_edges:
+                roots = _merge_components(roots, pending_rows, pending_cols)
+                pending_rows, pending_cols, pending = [], [], 0
+    if pending:
+        roots = _merge_components(roots, pending_rows, pending_cols)
+    
+    # Groups in order of their first image, members sharpest first (ties in
+    # image order), as one stable sort over the batch arrays
+    _, first_member, labels = np.unique(roots, return_index=True, return_inverse=True)
+    group_rank = np.argsort(np.argsort(first_member))[labels.reshape(-1)]
+    order = np.lexsort((-batch.blur, group_rank))
+    sizes = np.bincount(group_rank, minlength=len(first_member))
+    
+    duplicate_groups = []
+    log_each = logger.isEnabledFor(logging.DEBUG)
+    for members in np.split(order, np.cumsum(sizes)[:-1]):
+        # Only consider groups with 2+ images as duplicates
+        if len(members) >= 2:
+            group_images = [images[idx] for idx in members.tolist()]
+            duplicate_groups.append(group_images)
+            
+            if log_each:
+                logger.debug(f"Duplicate group {len(duplicate_groups)}: {len(group_images)} images, "
+                             f"best blur score: {group_images[0].blur_score:.3f}")
+    
+    logger.info(f"Found {len(duplicate_groups)} duplicate groups from {pair_count} similar pairs")
+    return duplicate_groups, pair_count
+
 def detect_graph_based_duplicates(images: List[Image], db: Database, 
                                  similarity_threshold: int = 10) -> Dict[str, int]:
     logger.info(f"Starting graph-based duplicate detection for {len(images)} images...")
@@ -105,29 +547,46 @@ def detect_graph_based_duplicates(images: List[Image], db: Database,
     try:
         # Step 1: Calculate perceptual hashes if not already done
         logger.info("Ensuring all images have perceptual hashes...")
-        for img in images:
-            if not img.hash and img.filename:
-                try:
-                    hashes = calculate_perceptual_hash(img.filename)
-                    # Use average hash as the primary hash
-                    img.hash = str(hashes['ahash'])
-                    logger.debug(f"Calculated hash for {img.filename}: {img.hash}")
-                except Exception as e:
-                    logger.warning(f"Could not calculate hash for {img.filename}: {e}")
-                    img.hash = ""  # Mark as processed but failed
+        pending = [img for img in images if not img.hash and img.filename]
+        if pending:
+            # One decode per file yields both the average hash and the blur
+            # score used to pick the best image of each group; the work is
+            # independent per file, so spread it over worker processes
+            analysis_results = []
+            failed = 0
+            log_each = logger.isEnabledFor(logging.DEBUG)
+            with ProcessPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1)) as executor:
+                futures = [executor.submit(analyze_file, img.filename) for img in pending]
+                for img, future in zip(pending, futures):
+                    try:
+                        _, blur_score, img.hash = future.result()
+                        if img.blur_score == 0.0:
+                            img.blur_score = blur_score
+                        if img.id is not None:
+                            analysis_results.append((img.id, img.blur_score, img.hash))
+                        if log_each:
+                            logger.debug(f"Calculated hash for {img.filename}: {img.hash}")
+                    except Exception as e:
+                        logger.warning(f"Could not calculate hash for {img.filename}: {e}")
+                        img.hash = ""  # Mark as processed but failed
+                        failed += 1
+            db.update_image_analysis_bulk(analysis_results)
+            logger.info(f"Calculated {len(pending) - failed} hashes ({failed} failed, "
+                        f"{len(images) - len(pending)} already known)")
         
-        # Step 2: Build similarity graph
-        graph = build_similarity_graph(images, similarity_threshold)
+        # Step 2: Stream similar pairs into connected-component duplicate
+        # groups (same result as components of the similarity graph, without
+        # building it or keeping all of its edges)
+        duplicate_groups, pair_count = group_similar_images(images, similarity_threshold)
         
-        # Step 3: Find connected components (duplicate groups)
-        duplicate_groups = find_connected_duplicate_groups(graph)
-        
-        # Step 4: Save duplicate groups to database
+        # Step 3: Save duplicate groups to database
         logger.info("Saving duplicate groups to database...")
-        group_id = 1
         duplicates_marked = 0
+        marks = []
+        groups_to_save = []
+        log_each = logger.isEnabledFor(logging.DEBUG)
         
-        for group_images in duplicate_groups:
+        for group_id, group_images in enumerate(duplicate_groups, 1):
             # Best image is already first (sorted by blur score)
             best_image = group_images[0]
             best_image.is_duplicate = False
@@ -139,27 +598,28 @@ def detect_graph_based_duplicates(images: List[Image], db: Database,
                 img.is_duplicate = True
                 img.duplicate_group = group_id
                 duplicate_ids.append(img.id)
+                marks.append((img.id or 0, group_id))
                 duplicates_marked += 1
-                
-                # Update in database
-                db.mark_as_duplicate(img.id or 0, group_id)
             
-            # Save duplicate group
-            dup_group = DuplicateGroup(
+            groups_to_save.append(DuplicateGroup(
                 id=group_id,
                 best_image_id=best_image.id,
-                image_ids=str(duplicate_ids)
-            )
-            db.save_duplicate_group(dup_group)
+                image_ids=json.dumps(duplicate_ids)
+            ))
             
-            logger.info(f"Saved duplicate group {group_id}: kept {best_image.filename}, "
-                       f"marked {len(duplicate_ids)} as duplicates")
-            group_id += 1
+            if log_each:
+                logger.debug(f"Duplicate group {group_id}: kept {best_image.filename}, "
+                             f"marked {len(duplicate_ids)} as duplicates")
+        
+        # Update the database in one transaction per table
+        db.mark_as_duplicates_bulk(marks)
+        db.save_duplicate_groups_bulk(groups_to_save)
+        logger.info(f"Saved {len(groups_to_save)} duplicate groups, marked {duplicates_marked} images as duplicates")
         
         stats = {
             "total_images": len(images),
-            "graph_nodes": graph.number_of_nodes(),
-            "graph_edges": graph.number_of_edges(),
+            "graph_nodes": len(images),
+            "graph_edges": pair_count,
             "duplicate_groups": len(duplicate_groups),
             "duplicates_marked": duplicates_marked,
             "images_kept": len(images) - duplicates_marked,
@@ -173,20 +633,34 @@ def detect_graph_based_duplicates(images: List[Image], db: Database,
         raise
 
 def analyze_graph_structure(graph: nx.Graph) -> Dict[str, Any]:
+    # All statistics come from one CSR view and one component labelling
+    # instead of separate NetworkX traversals per statistic
+    nodes, adjacency = _graph_csr(graph)
+    node_count = len(nodes)
+    edge_count = graph.number_of_edges()
+    _, labels = connected_components(adjacency, directed=False)
+    component_sizes = np.bincount(labels)
+    
+    # Local clustering: triangles through each node over the pairs of its
+    # neighbours, ignoring self-loops like NetworkX does
+    coo = adjacency.tocoo()
+    off_diagonal = coo.row != coo.col
+    simple = csr_matrix((np.ones(int(off_diagonal.sum()), dtype=np.int64),
+                         (coo.row[off_diagonal], coo.col[off_diagonal])), shape=adjacency.shape)
+    degree = np.diff(simple.indptr)
+    triangles = np.asarray((simple @ simple).multiply(simple).sum(axis=1)).reshape(-1) // 2
+    pairs = degree * (degree - 1)
+    clustering = np.divide(2 * triangles, pairs, out=np.zeros(node_count), where=pairs > 0)
+    
     stats = {
-        "nodes": graph.number_of_nodes(),
-        "edges": graph.number_of_edges(),
-        "connected_components": nx.number_connected_components(graph),
-        "density": nx.density(graph),
-        "average_clustering": nx.average_clustering(graph) if graph.number_of_nodes() > 0 else 0,
+        "nodes": node_count,
+        "edges": edge_count,
+        "connected_components": len(component_sizes),
+        "density": 2 * edge_count / (node_count * (node_count - 1)) if node_count > 1 else 0,
+        "average_clustering": float(clustering.sum() / node_count) if node_count > 0 else 0,
+        # Find largest component
+        "largest_component_size": int(component_sizes.max()) if node_count > 0 else 0,
     }
     
-    # Find largest component
-    if graph.number_of_nodes() > 0:
-        largest_cc = max(nx.connected_components(graph), key=len)
-        stats["largest_component_size"] = len(largest_cc)
-    else:
-        stats["largest_component_size"] = 0
-    
     logger.info(f"Graph structure analysis: {stats}")
     return stats
@@ -2,7 +2,14 @@ from typing import Optional
 from dataclasses import dataclass
 from datetime import datetime
 
-@dataclass
+def hash_to_int(hex_hash: str) -> Optional[int]:
+    """Integer value of a hex hash, or None if it is empty or not valid hex."""
+    try:
+        return int(hex_hash, 16) if hex_hash else None
+    except ValueError:
+        return None
+
+@dataclass(slots=True)
 class Image:
     """Represents an image in the album maker system."""
     id: Optional[int] = None
@@ -15,8 +22,9 @@ class Image:
     cluster_id: Optional[int] = None
     is_duplicate: bool = False
     duplicate_group: Optional[int] = None
+    content_hash: str = ""  # Fingerprint of the file bytes, used as analysis cache key
 
-@dataclass
+@dataclass(slots=True)
 class Cluster:
     """Represents a cluster of images grouped by location and time."""
     id: Optional[int] = None
@@ -27,7 +35,7 @@ class Cluster:
     end_time: Optional[datetime] = None
     image_count: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class DuplicateGroup:
     """Represents a group of duplicate images with a best image selected."""
     id: Optional[int] = None
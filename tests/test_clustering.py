@@ -16,6 +16,8 @@ from src.clustering import (
     are_images_proximate,
     find_proximate_images,
     combined_distance,
+    haversine_matrix,
+    combined_distance_matrix,
     hierarchical_cluster_images,
     cluster_images,
     calculate_cluster_metadata,
@@ -59,6 +61,21 @@ class TestGPSDistance:
         distance = calculate_gps_distance(img1, img2)
         assert distance == float('inf')
 
+    def test_haversine_matrix_matches_scalar(self):
+        """Vectorized matrix should agree with calculate_gps_distance pairwise."""
+        images = [
+            Image(id=1, filename='img1.jpg', latitude=40.7128, longitude=-74.0060),
+            Image(id=2, filename='img2.jpg', latitude=40.7589, longitude=-73.9851),
+            Image(id=3, filename='img3.jpg', latitude=34.0522, longitude=-118.2437),
+            Image(id=4, filename='img4.jpg'),  # No GPS data
+        ]
+
+        matrix = haversine_matrix(images)
+        for i, img1 in enumerate(images):
+            for j, img2 in enumerate(images):
+                if i != j:
+                    assert matrix[i, j] == pytest.approx(calculate_gps_distance(img1, img2))
+
 
 class TestTimeDifference:
     """Test time difference calculations."""
@@ -142,6 +159,26 @@ class TestImageProximity:
         assert len(pairs) == 1
         assert (1, 2) in pairs or (2, 1) in pairs
 
+    def test_find_proximate_images_matches_brute_force(self):
+        """The KD-tree prefilter should return exactly the brute-force pairs."""
+        time_base = datetime(2025, 10, 29, 10, 0, 0)
+
+        images = []
+        for i in range(40):
+            images.append(Image(
+                id=i,
+                latitude=40.70 + (i % 7) * 0.004 if i % 9 else None,
+                longitude=-74.00 + (i % 5) * 0.006,
+                timestamp=time_base + timedelta(minutes=17 * i) if i % 11 else None,
+            ))
+
+        expected = [(img1.id, img2.id) for i, img1 in enumerate(images) for img2 in images[i + 1:]
+                    if are_images_proximate(img1, img2, 1.0, 2.0)]
+        pairs = find_proximate_images(images, distance_threshold=1.0, time_threshold_hours=2.0)
+
+        assert expected
+        assert pairs == expected
+
 
 class TestHierarchicalClustering:
     """Test hierarchical clustering algorithm."""
@@ -160,6 +197,33 @@ class TestHierarchicalClustering:
         assert distance > 0
         assert distance < 1.0  # Should be relatively small
 
+    def test_combined_distance_early_exit(self):
+        """Pairs ruled out by time alone should skip GPS but still exceed the threshold."""
+        time_base = datetime(2025, 10, 29, 12, 0, 0)
+        img1 = Image(id=1, latitude=40.7128, longitude=-74.0060, timestamp=time_base)
+        img2 = Image(id=2, latitude=40.7130, longitude=-74.0062, timestamp=time_base + timedelta(hours=12))
+        img3 = Image(id=3, latitude=40.7130, longitude=-74.0062, timestamp=time_base + timedelta(minutes=30))
+
+        assert combined_distance(img1, img2, early_exit_threshold=0.1) > 0.1
+        assert combined_distance(img1, img3, early_exit_threshold=0.1) == combined_distance(img1, img3)
+
+    def test_combined_distance_matrix_matches_scalar(self):
+        """Vectorized matrix should agree with combined_distance pairwise."""
+        base_time = datetime(2025, 10, 29, 12, 0, 0)
+        images = [
+            Image(id=1, filename='img1.jpg', latitude=40.7128, longitude=-74.0060, timestamp=base_time),
+            Image(id=2, filename='img2.jpg', latitude=40.7589, longitude=-73.9851,
+                  timestamp=base_time + timedelta(hours=3)),
+            Image(id=3, filename='img3.jpg', timestamp=base_time + timedelta(hours=30)),
+            Image(id=4, filename='img4.jpg', latitude=40.7130, longitude=-74.0062),
+        ]
+
+        matrix = combined_distance_matrix(images)
+        for i, img1 in enumerate(images):
+            for j, img2 in enumerate(images):
+                if i != j:
+                    assert matrix[i, j] == pytest.approx(combined_distance(img1, img2))
+
     def test_hierarchical_cluster_empty_list(self):
         """Clustering empty image list should return empty dict."""
         result = hierarchical_cluster_images([])
@@ -291,8 +355,8 @@ class TestClusterStorage:
         ]
 
         # Add images to database first
-        for img in images:
-            img.id = db.add_image(img)
+        for img, image_id in zip(images, db.add_images_bulk(images)):
+            img.id = image_id
 
         # Create clustering results
         clusters = {0: images}
@@ -337,8 +401,8 @@ class TestClusterStorage:
         ]
 
         # Add images to database first
-        for img in images:
-            img.id = db.add_image(img)
+        for img, image_id in zip(images, db.add_images_bulk(images)):
+            img.id = image_id
 
         # Process clustering and save
         cluster_mapping = process_and_save_clustering(images, distance_threshold=1.0, time_threshold_hours=3.0)
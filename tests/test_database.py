@@ -0,0 +1,120 @@
+"""
+Tests for database bulk operations.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+from src.database import Database
+from src.models import Cluster, DuplicateGroup, Image as ImageModel
+
+
+@pytest.fixture
+def db():
+    """Create a database backed by a temporary file."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as tmp:
+        tmp_path = tmp.name
+    database = Database(tmp_path)
+    yield database
+    database.close()
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+
+class TestBulkImageOperations:
+    """Test batched image inserts and updates."""
+
+    def test_add_images_bulk_returns_ids_in_order(self, db):
+        """Bulk insert should return one id per image, matching insertion order."""
+        db.add_image(ImageModel(filename="existing.jpg"))
+        images = [ImageModel(filename=f"img{i}.jpg") for i in range(5)]
+
+        ids = db.add_images_bulk(images)
+
+        assert len(ids) == 5
+        for image_id, img in zip(ids, images):
+            assert db.get_image(image_id).filename == img.filename
+
+    def test_add_images_bulk_empty(self, db):
+        """Bulk insert of nothing should be a no-op."""
+        assert db.add_images_bulk([]) == []
+        assert db.get_all_images() == []
+
+    def test_update_blur_scores_bulk(self, db):
+        """Bulk blur score update should touch only the given images."""
+        ids = db.add_images_bulk([ImageModel(filename=f"img{i}.jpg") for i in range(3)])
+
+        db.update_blur_scores_bulk([(ids[0], 0.25), (ids[2], 0.75)])
+
+        assert db.get_image(ids[0]).blur_score == 0.25
+        assert db.get_image(ids[1]).blur_score == 0.0
+        assert db.get_image(ids[2]).blur_score == 0.75
+
+    def test_stored_blur_scores_spans_parameter_chunks(self, db):
+        """Stored scores are found for more ids than fit in one IN (...) query."""
+        images = [ImageModel(filename=f"img{i}.jpg", blur_score=0.0 if i % 3 == 0 else i / 2000) for i in range(1500)]
+        ids = db.add_images_bulk(images)
+
+        scores = db.stored_blur_scores(ids)
+
+        assert scores == {image_id: img.blur_score for image_id, img in zip(ids, images) if img.blur_score > 0}
+
+    def test_find_cached_analyses(self, db):
+        """Analyzed images are found by content hash in one lookup; unanalyzed ones are not."""
+        db.add_images_bulk([
+            ImageModel(filename="a.jpg", content_hash=f"c{i}", blur_score=i / 2000, hash=f"{i:016x}")
+            for i in range(1200)
+        ] + [ImageModel(filename="new.jpg", content_hash="fresh")])
+
+        cached = db.find_cached_analyses(["c5", "c1100", "fresh", "unknown", ""])
+
+        assert cached == {"c5": (5 / 2000, f"{5:016x}"), "c1100": (1100 / 2000, f"{1100:016x}")}
+        assert len(db.find_cached_analyses([f"c{i}" for i in range(1200)])) == 1200
+
+    def test_update_image_analysis_bulk(self, db):
+        """Bulk analysis update should set blur score and hash together."""
+        ids = db.add_images_bulk([ImageModel(filename=f"img{i}.jpg") for i in range(2)])
+
+        db.update_image_analysis_bulk([(ids[1], 0.5, "ffff000000000000")])
+
+        first, second = db.get_image(ids[0]), db.get_image(ids[1])
+        assert (first.blur_score, first.hash) == (0.0, "")
+        assert (second.blur_score, second.hash) == (0.5, "ffff000000000000")
+
+    def test_iter_images_streams_all_rows(self, db):
+        """Iterating in small batches should yield every image in insert order."""
+        ids = db.add_images_bulk([ImageModel(filename=f"img{i}.jpg") for i in range(5)])
+
+        assert [img.id for img in db.iter_images(batch_size=2)] == ids
+        assert db.count_images() == 5
+
+    def test_add_clusters_bulk_and_assign_images(self, db):
+        """Bulk cluster insert should return ids in order and bulk assignment should apply them."""
+        image_ids = db.add_images_bulk([ImageModel(filename=f"img{i}.jpg") for i in range(3)])
+
+        cluster_ids = db.add_clusters_bulk([Cluster(name="first", image_count=2), Cluster(name="second", image_count=1)])
+        db.update_image_clusters_bulk([(image_ids[0], cluster_ids[0]), (image_ids[1], cluster_ids[0]),
+                                       (image_ids[2], cluster_ids[1])])
+
+        assert [db.get_cluster(cluster_id).name for cluster_id in cluster_ids] == ["first", "second"]
+        assert [db.get_image(image_id).cluster_id for image_id in image_ids] == [cluster_ids[0], cluster_ids[0], cluster_ids[1]]
+        assert db.add_clusters_bulk([]) == []
+
+    def test_bulk_duplicate_marks_and_groups(self, db):
+        """Bulk duplicate writes should mark images and return group ids in order."""
+        image_ids = db.add_images_bulk([ImageModel(filename=f"img{i}.jpg") for i in range(3)])
+
+        group_ids = db.save_duplicate_groups_bulk([
+            DuplicateGroup(best_image_id=image_ids[0], image_ids=f"[{image_ids[1]}]"),
+            DuplicateGroup(best_image_id=image_ids[2], image_ids="[]"),
+        ])
+        db.mark_as_duplicates_bulk([(image_ids[1], group_ids[0])])
+
+        assert [group.best_image_id for group in db.get_all_duplicate_groups()] == [image_ids[0], image_ids[2]]
+        assert [db.get_duplicate_group(group_id).id for group_id in group_ids] == group_ids
+        marked = db.get_image(image_ids[1])
+        assert marked.is_duplicate and marked.duplicate_group == group_ids[0]
+        assert not db.get_image(image_ids[0]).is_duplicate
+        assert db.save_duplicate_groups_bulk([]) == []
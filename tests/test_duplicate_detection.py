@@ -81,6 +81,52 @@ class TestBlurDetection:
         finally:
             os.unlink(tmp_path)
 
+    def test_calculate_blur_scores_reuses_stored_scores(self):
+        """Scores already in the database should be reused without opening the file."""
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as tmp:
+            tmp_path = tmp.name
+
+        try:
+            db = Database(tmp_path)
+            scored, missing = ImageModel(filename="missing.jpg", blur_score=0.42), ImageModel(filename="gone.jpg")
+            scored.id, missing.id = db.add_images_bulk([scored, missing])
+            assert db.stored_blur_scores([scored.id, missing.id]) == {scored.id: 0.42}
+
+            # Stale in-memory copy of an image whose score is stored
+            stale = ImageModel(id=scored.id, filename="missing.jpg", blur_score=0.0)
+            result = calculate_blur_scores([stale, missing], db)
+
+            assert result[0].blur_score == 0.42
+            assert result[1].blur_score == 0.5  # File does not exist, so it was decoded and failed
+
+        finally:
+            os.unlink(tmp_path)
+
+    def test_calculate_blur_scores_chunked_failures_stay_per_image(self):
+        """A file that fails inside a worker chunk only affects its own score."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i in range(2):
+                path = os.path.join(tmp_dir, f"img{i}.png")
+                img = Image.new('RGB', (50, 50), color='white')
+                img.paste((0, 0, 0), (10, 10, 30 + i * 5, 40))
+                img.filter(ImageFilter.GaussianBlur(3)).save(path)
+                paths.append(path)
+            images = [ImageModel(filename=paths[0]), ImageModel(filename=os.path.join(tmp_dir, "gone.png")),
+                      ImageModel(filename=paths[1])]
+
+            with patch('src.duplicate_detection.BLUR_CHUNK_SIZE', 2):
+                result = calculate_blur_scores(images)
+
+            expected = calculate_blur_scores([ImageModel(filename=path) for path in paths])
+            assert [img.blur_score for img in result] == [expected[0].blur_score, 0.5, expected[1].blur_score]
+            assert 0.0 < result[0].blur_score < 0.5
+        finally:
+            for name in os.listdir(tmp_dir):
+                os.unlink(os.path.join(tmp_dir, name))
+            os.rmdir(tmp_dir)
+
 class TestGreedySelection:
     """Test greedy selection algorithm for duplicate groups."""
 
@@ -140,8 +186,8 @@ class TestBlurFiltering:
             ]
 
             # Add images to database first
-            for img in images:
-                img.id = db.add_image(img)
+            for img, image_id in zip(images, db.add_images_bulk(images)):
+                img.id = image_id
 
             # Mock the blur score calculation since we're testing the logic
             with patch('src.duplicate_detection.calculate_blur_scores', return_value=images):
@@ -180,8 +226,8 @@ class TestBlurFiltering:
             ]
 
             # Add images to database
-            for img in images:
-                img.id = db.add_image(img)
+            for img, image_id in zip(images, db.add_images_bulk(images)):
+                img.id = image_id
 
             # Mock blur calculation
             with patch('src.duplicate_detection.calculate_blur_scores', return_value=images):
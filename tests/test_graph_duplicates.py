@@ -5,16 +5,20 @@ Tests for graph-based duplicate detection functionality.
 import pytest
 import tempfile
 import os
+import shutil
 from PIL import Image, ImageDraw
 from unittest.mock import patch, MagicMock
 import networkx as nx
+import numpy as np
 import imagehash
 
 from src.graph_duplicates import (
     calculate_perceptual_hash,
     calculate_hash_distance,
     build_similarity_graph,
+    pairwise_hamming_below,
     find_connected_duplicate_groups,
+    group_similar_images,
     detect_graph_based_duplicates,
     analyze_graph_structure
 )
@@ -49,6 +53,77 @@ class TestPerceptualHashing:
         finally:
             os.unlink(tmp_path)
 
+    def test_calculate_perceptual_hash_from_open_image(self):
+        """Hashing an already opened image should match hashing its path."""
+        img = Image.new('RGB', (100, 100), color='white')
+        ImageDraw.Draw(img).rectangle([20, 20, 60, 80], fill='blue')
+
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+            img.save(tmp.name)
+            tmp_path = tmp.name
+
+        try:
+            from_path = calculate_perceptual_hash(tmp_path)
+            with Image.open(tmp_path) as opened:
+                from_image = calculate_perceptual_hash(opened.convert('L'))
+
+            assert from_image == from_path
+
+        finally:
+            os.unlink(tmp_path)
+
+    def test_calculate_perceptual_hash_matches_imagehash(self):
+        """Shared-grayscale hashes should equal imagehash's own functions."""
+        img = Image.new('RGB', (120, 80), color='white')
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([10, 10, 50, 70], fill='navy')
+        draw.ellipse([60, 15, 110, 65], fill='orange')
+
+        hashes = calculate_perceptual_hash(img)
+
+        assert hashes['ahash'] == imagehash.average_hash(img)
+        assert hashes['phash'] == imagehash.phash(img)
+        assert hashes['dhash'] == imagehash.dhash(img)
+
+    def test_perceptual_hash_thresholds_at_median(self):
+        """pHash splits the 8x8 DCT coefficients at their median, so half the bits are set."""
+        rng = np.random.default_rng(0)
+        img = Image.fromarray(rng.integers(0, 256, size=(96, 96), dtype=np.uint8))
+
+        hashes = calculate_perceptual_hash(img, kinds=('phash',))
+
+        assert int(hashes['phash'].hash.sum()) == 32
+
+    def test_calculate_perceptual_hash_selected_kinds(self):
+        """Only the requested hash kinds are computed, with the same values."""
+        img = Image.new('RGB', (64, 48), color='white')
+        ImageDraw.Draw(img).ellipse([8, 8, 40, 40], fill='green')
+
+        hashes = calculate_perceptual_hash(img, kinds=('ahash',))
+
+        assert list(hashes) == ['ahash']
+        assert hashes['ahash'] == imagehash.average_hash(img)
+
+    def test_calculate_perceptual_hash_large_png_matches_imagehash(self):
+        """The shared downsample for large non-JPEG files keeps smooth photos' hashes."""
+        img = Image.new('RGB', (1600, 1200), color='white')
+        draw = ImageDraw.Draw(img)
+        draw.ellipse([200, 150, 900, 800], fill='navy')
+        draw.rectangle([1000, 300, 1500, 1100], fill='orange')
+
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+            img.save(tmp.name)
+            tmp_path = tmp.name
+
+        try:
+            hashes = calculate_perceptual_hash(tmp_path)
+
+            assert hashes['ahash'] - imagehash.average_hash(img) <= 1
+            assert hashes['phash'] - imagehash.phash(img) <= 2
+            assert hashes['dhash'] - imagehash.dhash(img) <= 1
+        finally:
+            os.unlink(tmp_path)
+
     def test_calculate_hash_distance_identical(self):
         """Test hash distance for identical hashes."""
         hash_str = "0123456789abcdef"
@@ -63,6 +138,16 @@ class TestPerceptualHashing:
         # Should be maximum distance (64 bits all different)
         assert distance == 64
 
+    def test_reassigned_hash_is_used_for_similarity(self):
+        """A hash assigned after construction is what the graph compares."""
+        img1 = ImageModel(id=1, filename="a.jpg", hash="ffffffffffffffff")
+        img2 = ImageModel(id=2, filename="b.jpg", hash="ffffffffffffffff")
+        img1.hash = "0000000000000000"
+
+        graph = build_similarity_graph([img1, img2], similarity_threshold=5)
+
+        assert graph.number_of_edges() == 0
+
 class TestGraphConstruction:
     """Test similarity graph construction."""
 
@@ -125,6 +210,89 @@ class TestGraphConstruction:
         assert 'distance' in edge_data
         assert edge_data['distance'] == 1
 
+    def test_build_similarity_graph_skips_invalid_and_mismatched_hashes(self):
+        """Invalid hashes and hashes of a different size never get edges."""
+        images = [
+            ImageModel(id=1, filename="img1.jpg", hash="0000000000000000"),
+            ImageModel(id=2, filename="img2.jpg", hash="00000000"),  # 32-bit hash
+            ImageModel(id=3, filename="img3.jpg", hash="not-a-hash"),
+            ImageModel(id=4, filename="img4.jpg", hash="0000000000000003"),
+        ]
+
+        graph = build_similarity_graph(images, similarity_threshold=5)
+
+        assert graph.number_of_nodes() == 4
+        assert list(graph.edges()) == [(1, 4)]
+        assert graph.get_edge_data(1, 4)['distance'] == 2
+
+    def test_build_similarity_graph_wide_hashes(self):
+        """256-bit hashes are compared word by word with the full distance."""
+        images = [
+            ImageModel(id=1, filename="img1.jpg", hash="0" * 64),
+            ImageModel(id=2, filename="img2.jpg", hash="f" + "0" * 62 + "1"),  # Distance: 5
+            ImageModel(id=3, filename="img3.jpg", hash="f" * 64),
+        ]
+
+        graph = build_similarity_graph(images, similarity_threshold=260)
+
+        assert graph.get_edge_data(1, 2)['distance'] == 5
+        assert graph.get_edge_data(1, 3)['distance'] == 256
+        assert graph.get_edge_data(2, 3)['distance'] == 251
+        assert graph.get_edge_data(1, 2)['distance'] == calculate_hash_distance(images[0].hash, images[1].hash)
+
+    def test_pairwise_hamming_below_matches_brute_force(self):
+        """Blocked upper-triangle scan should find exactly the brute-force pairs."""
+        rng = np.random.default_rng(0)
+        base = rng.integers(0, 2**63, size=20, dtype=np.uint64)
+        flips = np.uint64(1) << rng.integers(0, 64, size=200).astype(np.uint64)
+        hashes = base[rng.integers(0, 20, size=200)] ^ flips
+
+        with patch('src.graph_duplicates.HAMMING_BLOCK_BYTES', 10 * 200 * 17):  # 17-row blocks
+            rows, cols, distances = pairwise_hamming_below(hashes, 3)
+
+        full = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        expected_rows, expected_cols = np.nonzero(np.triu(full <= 3, k=1))
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+        np.testing.assert_array_equal(distances, full[expected_rows, expected_cols])
+
+    def test_pairwise_hamming_below_band_prefilter_is_exact(self):
+        """Small thresholds go through the band prefilter and must find every pair."""
+        rng = np.random.default_rng(2)
+        base = rng.integers(0, 2**63, size=500, dtype=np.uint64)
+        # Near-duplicates with 1-3 flipped bits, plus unrelated hashes
+        flips = np.zeros(500, dtype=np.uint64)
+        for _ in range(3):
+            flips |= np.uint64(1) << rng.integers(0, 63, size=500).astype(np.uint64)
+        hashes = np.concatenate([base, base ^ flips])
+
+        rows, cols, distances = pairwise_hamming_below(hashes, 3)
+
+        full = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        expected_rows, expected_cols = np.nonzero(np.triu(full <= 3, k=1))
+        assert len(rows) >= 500
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+        np.testing.assert_array_equal(distances, full[expected_rows, expected_cols])
+
+        # Candidates split into tiny chunks give the same pairs
+        with patch('src.graph_duplicates.BAND_PAIR_CHUNK', 5):
+            chunked = pairwise_hamming_below(hashes, 3)
+        for actual, expected in zip(chunked, (rows, cols, distances)):
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_pairwise_hamming_below_with_repeated_hashes(self):
+        """Identical hashes are collapsed but every image pair is still reported."""
+        hashes = np.array([5, 0, 5, 7, 0, 5, 2**63], dtype=np.uint64)
+
+        rows, cols, distances = pairwise_hamming_below(hashes, 1)
+
+        full = np.bitwise_count(hashes[:, None] ^ hashes[None, :])
+        expected_rows, expected_cols = np.nonzero(np.triu(full <= 1, k=1))
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+        np.testing.assert_array_equal(distances, full[expected_rows, expected_cols])
+
 class TestConnectedComponents:
     """Test connected component detection."""
 
@@ -183,6 +351,20 @@ class TestConnectedComponents:
         group_sizes = sorted([len(g) for g in groups])
         assert group_sizes == [2, 3]
 
+    def test_group_similar_images_matches_graph_components(self):
+        """Union-find grouping should equal components of the similarity graph."""
+        hashes = ["0000000000000000", "0000000000000001", "ffffffffffffffff",
+                  "0000000000000003", "fffffffffffffff0", "00000000ffffffff", "0000000000000000"]
+        images = [ImageModel(id=i + 1, filename=f"img{i + 1}.jpg", hash=h, blur_score=0.1 * (i % 4))
+                  for i, h in enumerate(hashes)]
+
+        groups, pair_count = group_similar_images(images, similarity_threshold=4)
+        graph = build_similarity_graph(images, similarity_threshold=4)
+
+        assert pair_count == graph.number_of_edges()
+        assert [[img.id for img in group] for group in groups] == \
+            [[img.id for img in group] for group in find_connected_duplicate_groups(graph)]
+
 class TestGraphBasedDuplicateDetection:
     """Test complete graph-based duplicate detection pipeline."""
 
@@ -204,8 +386,8 @@ class TestGraphBasedDuplicateDetection:
             ]
 
             # Add to database
-            for img in images:
-                img.id = db.add_image(img)
+            for img, image_id in zip(images, db.add_images_bulk(images)):
+                img.id = image_id
 
             # Run graph-based detection
             stats = detect_graph_based_duplicates(images, db, similarity_threshold=5)
@@ -224,6 +406,32 @@ class TestGraphBasedDuplicateDetection:
             if os.path.exists(tmp_path):
                 os.unlink(tmp_path)
 
+    def test_detect_graph_based_duplicates_analyzes_missing_hashes(self):
+        """Images without a hash get hash and blur score from one decode, persisted."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db = Database(os.path.join(tmp_dir, 'test.db'))
+            images = []
+            for i in range(2):
+                img = Image.new('RGB', (80, 80), color='white')
+                ImageDraw.Draw(img).rectangle([10, 10, 50, 70], fill='black')
+                path = os.path.join(tmp_dir, f'img{i}.png')
+                img.save(path)
+                model = ImageModel(filename=path)
+                model.id = db.add_image(model)
+                images.append(model)
+
+            stats = detect_graph_based_duplicates(images, db, similarity_threshold=5)
+
+            assert stats["duplicate_groups"] == 1
+            stored = db.get_image(images[0].id)
+            with Image.open(images[0].filename) as opened:
+                assert stored.hash == images[0].hash == str(imagehash.average_hash(opened))
+            assert stored.blur_score == images[0].blur_score > 0.0
+            db.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
 class TestGraphAnalysis:
     """Test graph structure analysis."""
 
@@ -246,3 +454,15 @@ class TestGraphAnalysis:
         assert stats["connected_components"] == 2
         assert "density" in stats
         assert "largest_component_size" in stats
+
+    def test_analyze_graph_structure_matches_networkx(self):
+        """Array-based statistics agree with NetworkX's own algorithms."""
+        G = nx.gnm_random_graph(30, 60, seed=3)
+        G.add_edges_from([(30, 31), (31, 32), (30, 32), (33, 33)])
+
+        stats = analyze_graph_structure(G)
+
+        assert stats["connected_components"] == nx.number_connected_components(G)
+        assert stats["density"] == pytest.approx(nx.density(G))
+        assert stats["average_clustering"] == pytest.approx(nx.average_clustering(G))
+        assert stats["largest_component_size"] == len(max(nx.connected_components(G), key=len))
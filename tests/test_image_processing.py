@@ -0,0 +1,90 @@
+"""
+Tests for image processing utilities.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+import imagehash
+
+from src.image_processing import ahash_from_gray, ahash_u64, detect_blur, load_gray, preprocess_image
+
+
+class TestAverageHash:
+    """Test the NumPy average hash implementation."""
+
+    def test_ahash_u64_matches_imagehash(self):
+        """Packed hash should match imagehash's hex representation."""
+        img = Image.new('RGB', (120, 90), color='white')
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([10, 10, 60, 70], fill='black')
+        draw.ellipse([70, 20, 110, 80], fill='gray')
+
+        assert format(ahash_u64(img), '016x') == str(imagehash.average_hash(img))
+
+    def test_ahash_u64_uniform_image(self):
+        """A flat image has no pixel above its mean."""
+        img = Image.new('L', (64, 64), color=128)
+        assert ahash_u64(img) == 0
+
+    def test_ahash_from_gray_matches_ahash_u64(self):
+        """Hashing an 8x8 array directly should match the PIL entry point."""
+        thumb = np.arange(64, dtype=np.uint8).reshape(8, 8)
+
+        assert ahash_from_gray(thumb) == ahash_u64(Image.fromarray(thumb))
+        assert ahash_from_gray(thumb) == 0x00000000ffffffff
+
+
+class TestDetectBlur:
+    """Test blur detection input handling."""
+
+    def test_detect_blur_accepts_arrays(self):
+        """Arrays should score like the PIL image they came from."""
+        rng = np.random.default_rng(1)
+        noise = Image.fromarray(rng.integers(0, 256, size=(60, 80), dtype=np.uint8))
+        gray = noise.filter(ImageFilter.GaussianBlur(2))  # keep the score below the 1.0 cap
+        rgb = Image.merge('RGB', [gray, gray, gray])
+
+        assert detect_blur(np.asarray(gray)) == detect_blur(gray)
+        assert detect_blur(np.asarray(rgb)) == pytest.approx(detect_blur(rgb), abs=0.001)
+
+
+class TestLoadGray:
+    """Test grayscale decoding of image files."""
+
+    @pytest.mark.parametrize('mode', ['RGB', 'L', 'CMYK'])
+    def test_load_gray_jpeg_matches_pil_luma(self, mode):
+        """JPEGs decode to the same pixels as PIL's own grayscale draft."""
+        img = Image.new('RGB', (120, 90), color='white')
+        ImageDraw.Draw(img).ellipse([10, 10, 80, 70], fill='purple')
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+            img.convert(mode).save(tmp.name)
+            tmp_path = tmp.name
+
+        try:
+            with Image.open(tmp_path) as expected:
+                expected.draft('L', expected.size)
+                expected = expected.convert('L')
+            gray = load_gray(tmp_path)
+
+            assert gray.mode == 'L'
+            np.testing.assert_array_equal(np.asarray(gray), np.asarray(expected))
+        finally:
+            os.unlink(tmp_path)
+
+
+class TestPreprocessImage:
+    """Test analysis preprocessing."""
+
+    def test_preprocess_image_downscales_keeping_aspect_ratio(self):
+        """Large images shrink to 1024px on the long side, small ones are only converted."""
+        large = preprocess_image(Image.new('RGBA', (3000, 1500), color='red'))
+        small = preprocess_image(Image.new('L', (200, 100), color=50))
+
+        assert (large.size, large.mode) == ((1024, 512), 'RGB')
+        assert large.getpixel((10, 10)) == (255, 0, 0)
+        assert (small.size, small.mode) == ((200, 100), 'RGB')
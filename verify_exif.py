@@ -3,68 +3,55 @@
 Verify EXIF data in sample images.
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
+import piexif
 from datetime import datetime
 
+def _dms_to_decimal(dms, ref):
+    """Convert ((num, den), (num, den), (num, den)) rationals to signed degrees."""
+    degrees, minutes, seconds = (num / den for num, den in dms)
+    decimal = degrees + minutes / 60 + seconds / 3600
+    return -decimal if ref in ('S', 'W') else decimal
+
 def check_image_exif(image_path):
     """Check if image has GPS and DateTime EXIF data."""
     try:
-        img = Image.open(image_path)
-        exif = img.getexif()
+        # piexif parses only the APP1 segment; no Pillow image object or
+        # decoder is set up just to read a few tags
+        exif = piexif.load(str(image_path))
         
         has_gps = False
         has_datetime = False
         gps_coords = None
         dt = None
         
-        if exif:
-            # Check DateTime from Exif IFD (not main EXIF!)
-            try:
-                exif_ifd = exif.get_ifd(0x8769)  # Exif IFD
-                if exif_ifd:
-                    for tag_id, value in exif_ifd.items():
-                        tag = TAGS.get(tag_id, tag_id)
-                        if tag == "DateTime" or tag == "DateTimeOriginal":
-                            has_datetime = True
-                            dt = value.decode('utf-8') if isinstance(value, bytes) else str(value)
-                            break
-            except:
-                pass
-            
-            # Check GPS using get_ifd (correct method!)
-            try:
-                gps_ifd = exif.get_ifd(0x8825)  # GPS IFD tag
-                if gps_ifd:
-                    gps_data = {}
-                    for gps_tag_id, value in gps_ifd.items():
-                        gps_tag = GPSTAGS.get(gps_tag_id, gps_tag_id)
-                        gps_data[gps_tag] = value
-                    
-                    if 'GPSLatitude' in gps_data and 'GPSLongitude' in gps_data:
-                        has_gps = True
-                        lat = gps_data['GPSLatitude']
-                        lon = gps_data['GPSLongitude']
-                        lat_ref = gps_data.get('GPSLatitudeRef', b'N')
-                        lon_ref = gps_data.get('GPSLongitudeRef', b'E')
-                        
-                        # Handle bytes
-                        if isinstance(lat_ref, bytes):
-                            lat_ref = lat_ref.decode('utf-8')
-                        if isinstance(lon_ref, bytes):
-                            lon_ref = lon_ref.decode('utf-8')
-                        
-                        # Convert to decimal
-                        lat_decimal = lat[0] + lat[1]/60 + lat[2]/3600
-                        lon_decimal = lon[0] + lon[1]/60 + lon[2]/3600
-                        lat_decimal = lat_decimal * (-1 if lat_ref == 'S' else 1)
-                        lon_decimal = lon_decimal * (-1 if lon_ref == 'W' else 1)
-                        gps_coords = (lat_decimal, lon_decimal)
-            except:
-                pass
+        # Check DateTime from Exif IFD (not main EXIF!)
+        exif_ifd = exif.get('Exif') or {}
+        value = exif_ifd.get(piexif.ExifIFD.DateTimeOriginal) or exif_ifd.get(piexif.ImageIFD.DateTime)
+        if value:
+            has_datetime = True
+            dt = value.decode('utf-8') if isinstance(value, bytes) else str(value)
+        
+        # Check GPS from the GPS IFD
+        try:
+            gps_ifd = exif.get('GPS') or {}
+            if piexif.GPSIFD.GPSLatitude in gps_ifd and piexif.GPSIFD.GPSLongitude in gps_ifd:
+                has_gps = True
+                lat_ref = gps_ifd.get(piexif.GPSIFD.GPSLatitudeRef, b'N')
+                lon_ref = gps_ifd.get(piexif.GPSIFD.GPSLongitudeRef, b'E')
+                
+                # Handle bytes
+                if isinstance(lat_ref, bytes):
+                    lat_ref = lat_ref.decode('utf-8')
+                if isinstance(lon_ref, bytes):
+                    lon_ref = lon_ref.decode('utf-8')
+                
+                gps_coords = (_dms_to_decimal(gps_ifd[piexif.GPSIFD.GPSLatitude], lat_ref),
+                              _dms_to_decimal(gps_ifd[piexif.GPSIFD.GPSLongitude], lon_ref))
+        except (TypeError, ValueError, ZeroDivisionError):
+            pass
         
-        img.close()
         return has_gps, has_datetime, gps_coords, dt
     
     except Exception as e:
@@ -87,11 +74,14 @@ def main():
     without_exif = 0
     errors = []
     
-    # Check first 10 in detail
+    # One parallel pass over all images, in sorted order so the first 10
+    # results double as the detailed check
+    images = sorted(images)
+    with ProcessPoolExecutor() as executor:
+        results = list(executor.map(check_image_exif, images, chunksize=32))
+    
     print("🔍 Detailed check of first 10 images:")
-    for i, img_path in enumerate(sorted(images)[:10]):
-        has_gps, has_dt, coords, dt = check_image_exif(img_path)
-        
+    for img_path, (has_gps, has_dt, coords, dt) in zip(images[:10], results):
         status = []
         if has_gps and coords:
             status.append(f"✅ GPS: ({coords[0]:.4f}, {coords[1]:.4f})")
@@ -106,9 +96,7 @@ def main():
         print(f"  {img_path.name}: {' | '.join(status)}")
     
     print("\n📊 Checking all images...")
-    for img_path in images:
-        has_gps, has_dt, coords, dt = check_image_exif(img_path)
-        
+    for img_path, (has_gps, has_dt, coords, dt) in zip(images, results):
         if has_gps:
             with_gps += 1
         if has_dt: